@@ -1,11 +1,18 @@
+import argparse
 import sys
 import os
-from parser import Parser, InstructionType
-from hack_code import dest, comp, jump
+from typing import Callable, Iterable, Iterator
+from parser import Instruction, InstructionType, parse_lines, read_instructions
+from hack_code import encode_a, encode_c, to_text
+from optimizer import OptimizeReport, optimize
+from rom_image import write_rom
 from symbol import Symbol
 
 RAM_START_ADDRESS = 16
 
+# 出力が変わる変更を入れたら上げる（キャッシュの無効化に使う）
+ASSEMBLER_VERSION = "1"
+
 
 def resolve_address(symbol: Symbol, sym: str, ram_addr: int) -> tuple[int, int]:
     if sym.isdigit():
@@ -18,52 +25,154 @@ def resolve_address(symbol: Symbol, sym: str, ram_addr: int) -> tuple[int, int]:
     return ram_addr, ram_addr + 1
 
 
-def generate_a_instruction(
-    parser: Parser, symbol: Symbol, ram_addr: int
-) -> tuple[str, int]:
-    addr, new_ram_addr = resolve_address(symbol, parser.symbol(), ram_addr)
-    return format(addr, "016b"), new_ram_addr
+def generate_a_instruction(sym: str, symbol: Symbol, ram_addr: int) -> tuple[int, int]:
+    addr, new_ram_addr = resolve_address(symbol, sym, ram_addr)
+    return encode_a(addr), new_ram_addr
 
 
-def main() -> None:
-    if len(sys.argv) != 2:
-        print("引数は一つのみ")
-        sys.exit(1)
+def resolve_labels(instructions: list[Instruction], symbol: Symbol) -> None:
+    row_num = 0
+    for inst in instructions:
+        if inst.type == InstructionType.L_INSTRUCTION:
+            symbol.addEntry(inst.text, row_num)
+        else:
+            row_num += 1
 
-    asm_file = sys.argv[1]
-    hack_file = asm_file.replace(".asm", ".hack")
 
-    # 1 pass: ラベル処理
-    symbol = Symbol()
-    row_num = 0
-    with Parser(asm_file) as p1:
-        while p1.hasMoreLines():
-            p1.advance()
-            if p1.instructionType() == InstructionType.L_INSTRUCTION:
-                symbol.addEntry(p1.symbol(), row_num)
-            else:
-                row_num += 1
-
-    # 2 pass: コード生成
-    ram_addr = RAM_START_ADDRESS
-    try:
-        with Parser(asm_file) as p2, open(hack_file, "w") as f:
-            while p2.hasMoreLines():
-                p2.advance()
-                inst_type = p2.instructionType()
-
-                if inst_type == InstructionType.A_INSTRUCTION:
-                    bin_code, ram_addr = generate_a_instruction(p2, symbol, ram_addr)
-                    f.write(bin_code + "\n")
-                elif inst_type == InstructionType.C_INSTRUCTION:
-                    bin_code = (
-                        "111" + comp(p2.comp()) + dest(p2.dest()) + jump(p2.jump())
+class AssemblerError(Exception):
+    def __init__(self, message: str, lineno: int | None = None) -> None:
+        self.message = message
+        self.lineno = lineno
+        if lineno is None:
+            super().__init__(message)
+        else:
+            super().__init__(f"line {lineno}: {message}")
+
+
+class Assembly:
+    # 1 pass（ラベル解決）は生成時に行い、2 pass は反復時に遅延実行する
+    def __init__(
+        self, instructions: list[Instruction], optimize_code: bool = False
+    ) -> None:
+        self.report: OptimizeReport | None = None
+        if optimize_code:
+            # ラベル解決の前に最適化するので、ラベルは最適化後のアドレスになる
+            instructions, self.report = optimize(instructions)
+        self.instructions = instructions
+        self.symbol = Symbol()
+        # 次に割り当てる変数のRAMアドレス。反復をやり直しても同じ割り当てになる
+        self.ram_addr = RAM_START_ADDRESS
+        resolve_labels(instructions, self.symbol)
+
+    def __iter__(self) -> Iterator[int]:
+        for inst in self.instructions:
+            if inst.type == InstructionType.L_INSTRUCTION:
+                continue
+            try:
+                if inst.type == InstructionType.A_INSTRUCTION:
+                    if not inst.text:
+                        raise Exception("A命令のシンボルがない")
+                    word, self.ram_addr = generate_a_instruction(
+                        inst.text, self.symbol, self.ram_addr
                     )
-                    f.write(bin_code + "\n")
+                else:
+                    word = encode_c(inst.text)
+            except Exception as e:
+                raise AssemblerError(str(e), inst.lineno) from e
+            yield word
+
+    def words(self) -> list[int]:
+        return list(self)
+
+    def labels(self) -> dict[str, int]:
+        return {
+            inst.text: self.symbol.getAddress(inst.text)
+            for inst in self.instructions
+            if inst.type == InstructionType.L_INSTRUCTION
+        }
+
+
+def assemble(lines: Iterable[str], optimize_code: bool = False) -> Assembly:
+    # 行のイテラブルをアセンブルする。ソース文字列は assemble_source()、
+    # ファイルは assemble_file() を使う
+    if isinstance(lines, str):
+        # 文字列を渡すと1文字ずつの行になってしまうので受け付けない
+        raise TypeError("assemble() は行のイテラブルを受け取る（文字列は assemble_source()）")
+    return Assembly(parse_lines(lines), optimize_code)
+
+
+def assemble_source(source: str, optimize_code: bool = False) -> Assembly:
+    return Assembly(parse_lines(source.splitlines()), optimize_code)
+
+
+def assemble_file(filename: str | os.PathLike, optimize_code: bool = False) -> Assembly:
+    return Assembly(read_instructions(os.fspath(filename)), optimize_code)
+
+
+def assemble_words(asm_file: str) -> list[int]:
+    # ソースは一度だけ読み込み、両パスで同じ命令リストを使う
+    return assemble_file(asm_file).words()
+
+
+def assemble_optimized_words(asm_file: str) -> list[int]:
+    assembly = assemble_file(asm_file, optimize_code=True)
+    words = assembly.words()
+    print(assembly.report)
+    return words
+
+
+def write_output(filename: str, words: list[int], output_format: str) -> None:
+    if output_format == "rom":
+        write_rom(filename, words)
+    else:
+        with open(filename, "w") as f:
+            f.write(to_text(words))
+
+
+def output_filename(asm_file: str, output_format: str) -> str:
+    return os.path.splitext(asm_file)[0] + "." + output_format
+
+
+def assemble_to_file(
+    asm_file: str,
+    output_file: str,
+    output_format: str,
+    assembler: Callable[[str], list[int]] = assemble_words,
+) -> int:
+    # 失敗した場合は中途半端な出力ファイルを残さない
+    try:
+        # 2 pass の結果は16ビット整数のまま保持し、最後にまとめて書き出す
+        words = assembler(asm_file)
+        write_output(output_file, words, output_format)
+    except Exception:
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        raise
+    return len(words)
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Hack assembler")
+    arg_parser.add_argument("asm_file")
+    arg_parser.add_argument(
+        "--format",
+        choices=("hack", "rom"),
+        default="hack",
+        help="hack: テキスト形式 / rom: uint16 のバイナリROMイメージ",
+    )
+    arg_parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="冗長なロードや到達不能コードを除去してからアセンブルする",
+    )
+    args = arg_parser.parse_args()
+
+    output_file = output_filename(args.asm_file, args.format)
+    assembler = assemble_optimized_words if args.optimize else assemble_words
+    try:
+        assemble_to_file(args.asm_file, output_file, args.format, assembler)
     except Exception as e:
         print(f"Error: {e}")
-        if os.path.exists(hack_file):
-            os.remove(hack_file)
         sys.exit(1)
 
 
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+
+from assembler import ASSEMBLER_VERSION, assemble
+
+DEFAULT_CACHE_DIR = ".asm_cache"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+ENTRY_SUFFIX = ".json"
+
+
+class AssemblyCache:
+    # ソースのハッシュとアセンブラのバージョンをキーに、ラベル表と出力を保存する
+    def __init__(
+        self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, source: bytes) -> str:
+        digest = hashlib.sha256()
+        digest.update(ASSEMBLER_VERSION.encode())
+        digest.update(b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    def _entryPath(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def get(self, key: str) -> dict | None:
+        path = self._entryPath(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not self.isValid(entry, key):
+            # 壊れたエントリや古い形式は捨てる
+            self._remove(path)
+            return None
+
+        # 最近使ったものとして残るように更新時刻を進める
+        os.utime(path)
+        return entry
+
+    def isValid(self, entry: dict, key: str) -> bool:
+        return (
+            isinstance(entry, dict)
+            and entry.get("version") == ASSEMBLER_VERSION
+            and entry.get("key") == key
+            and isinstance(entry.get("labels"), dict)
+            and isinstance(entry.get("words"), list)
+        )
+
+    def put(self, key: str, labels: dict[str, int], words: list[int]) -> None:
+        entry = {
+            "version": ASSEMBLER_VERSION,
+            "key": key,
+            "labels": labels,
+            "words": words,
+        }
+        path = self._entryPath(key)
+        # 並列に書き込まれても壊れないように一時ファイルから置き換える
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def assemble(self, asm_file: str) -> list[int]:
+        with open(asm_file, "rb") as f:
+            source = f.read()
+        key = self.key(source)
+
+        entry = self.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry["words"]
+
+        self.misses += 1
+        assembly = assemble(source.decode().splitlines())
+        words = assembly.words()
+        self.put(key, assembly.labels(), words)
+        return words
+
+    def evict(self) -> int:
+        # 古いものから削除し、合計サイズを上限以下に抑える
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,146 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import repeat
+
+from assembler import assemble_to_file, output_filename
+from assembly_cache import DEFAULT_CACHE_DIR, AssemblyCache
+
+
+@dataclass
+class BatchResult:
+    asm_file: str
+    output_file: str
+    words: int
+    seconds: float
+    error: str | None = None
+    cached: bool = False
+
+
+def available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def collect_asm_files(targets: list[str]) -> list[str]:
+    # ディレクトリ・グロブ・ファイルを受け付け、重複を除いてソートする
+    found: set[str] = set()
+    for target in targets:
+        if os.path.isdir(target):
+            paths = glob.glob(os.path.join(target, "*.asm"))
+        elif glob.has_magic(target):
+            paths = glob.glob(target, recursive=True)
+        else:
+            paths = [target]
+
+        for path in paths:
+            if not path.endswith(".asm") or not os.path.isfile(path):
+                if path == target:
+                    raise Exception(f"Specified asm file does not exist: {target}")
+                continue
+            found.add(os.path.abspath(path))
+
+    if not found:
+        raise Exception("No asm files found")
+    return sorted(found)
+
+
+def assemble_one(
+    asm_file: str, output_format: str, cache_dir: str | None = None
+) -> BatchResult:
+    output_file = output_filename(asm_file, output_format)
+    start = time.perf_counter()
+    cache = AssemblyCache(cache_dir) if cache_dir is not None else None
+    try:
+        if cache is None:
+            words = assemble_to_file(asm_file, output_file, output_format)
+        else:
+            words = assemble_to_file(
+                asm_file, output_file, output_format, cache.assemble
+            )
+    except Exception as e:
+        return BatchResult(
+            asm_file, output_file, 0, time.perf_counter() - start, str(e)
+        )
+    return BatchResult(
+        asm_file,
+        output_file,
+        words,
+        time.perf_counter() - start,
+        cached=cache is not None and cache.hits > 0,
+    )
+
+
+def assemble_batch(
+    asm_files: list[str],
+    output_format: str = "hack",
+    jobs: int | None = None,
+    cache_dir: str | None = None,
+) -> list[BatchResult]:
+    # 結果は常に入力（ソート済み）の順に並ぶ
+    jobs = jobs or available_cores()
+    if jobs == 1 or len(asm_files) == 1:
+        results = [assemble_one(path, output_format, cache_dir) for path in asm_files]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(asm_files))) as executor:
+            results = list(
+                executor.map(
+                    assemble_one, asm_files, repeat(output_format), repeat(cache_dir)
+                )
+            )
+
+    if cache_dir is not None:
+        AssemblyCache(cache_dir).evict()
+    return results
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Hack assembler (batch mode)")
+    arg_parser.add_argument("targets", nargs="+", help="asm file, directory or glob")
+    arg_parser.add_argument("--format", choices=("hack", "rom"), default="hack")
+    arg_parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="worker数（既定: 利用可能なコア数）"
+    )
+    arg_parser.add_argument(
+        "--cache",
+        nargs="?",
+        const=DEFAULT_CACHE_DIR,
+        default=None,
+        metavar="DIR",
+        help=f"変更のないファイルを再利用する（既定: {DEFAULT_CACHE_DIR}）",
+    )
+    args = arg_parser.parse_args()
+
+    asm_files = collect_asm_files(args.targets)
+    start = time.perf_counter()
+    results = assemble_batch(asm_files, args.format, args.jobs, args.cache)
+    elapsed = time.perf_counter() - start
+
+    failed = 0
+    for result in results:
+        if result.error is None:
+            status = "CACHE" if result.cached else "OK"
+            print(
+                f"{status:5} {result.asm_file}: {result.words} words"
+                f" ({result.seconds * 1000:.1f} ms)"
+            )
+        else:
+            failed += 1
+            print(f"ERROR {result.asm_file}: {result.error}")
+
+    total_words = sum(result.words for result in results)
+    print(
+        f"{len(results)} files, {failed} failed, {total_words} words"
+        f" in {elapsed:.2f} s"
+    )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
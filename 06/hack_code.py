@@ -68,3 +68,55 @@ def jump(mnemonic: str) -> str:
     if mnemonic not in JUMP_MAP:
         raise Exception(f"不適切なjumpニーモニック: {mnemonic}")
     return JUMP_MAP[mnemonic]
+
+
+# 16ビット整数としてのエンコード表
+DEST_BITS = {k: int(v, 2) << 3 for k, v in DEST_MAP.items()}
+COMP_BITS = {k: int(v, 2) << 6 for k, v in COMP_MAP.items()}
+JUMP_BITS = {k: int(v, 2) for k, v in JUMP_MAP.items()}
+C_PREFIX = 0b111 << 13
+
+
+def _build_c_table() -> dict[str, int]:
+    # "dest=comp;jump" の全組み合わせを生のテキストから直接引けるようにする
+    table: dict[str, int] = {}
+    for d, d_bits in DEST_BITS.items():
+        for c, c_bits in COMP_BITS.items():
+            for j, j_bits in JUMP_BITS.items():
+                text = c
+                if d != "null":
+                    text = f"{d}={text}"
+                if j != "null":
+                    text = f"{text};{j}"
+                table[text] = C_PREFIX | d_bits | c_bits | j_bits
+    return table
+
+
+C_INSTRUCTION_TABLE = _build_c_table()
+
+
+def encode_c(text: str) -> int:
+    word = C_INSTRUCTION_TABLE.get(text)
+    if word is not None:
+        return word
+
+    # 表にない書き方（"null=" の明示など）は分解してエンコードし、結果を覚えておく
+    d, c, j = "null", text, "null"
+    if ";" in c:
+        c, j = c.split(";", 1)
+    if "=" in c:
+        d, c = c.split("=", 1)
+    word = C_PREFIX | int(dest(d), 2) << 3 | int(comp(c), 2) << 6 | int(jump(j), 2)
+    C_INSTRUCTION_TABLE[text] = word
+    return word
+
+
+def encode_a(address: int) -> int:
+    if not 0 <= address < 0x8000:
+        raise Exception(f"A命令のアドレスが範囲外: {address}")
+    return address
+
+
+def to_text(words: list[int]) -> str:
+    # 出力時にまとめて "0101...\n" 形式へ変換する
+    return "".join([f"{w:016b}\n" for w in words])
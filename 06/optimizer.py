@@ -0,0 +1,129 @@
+from collections import Counter
+from dataclasses import dataclass, field
+
+from parser import Instruction, InstructionType, split_c_instruction
+
+# NOTE: ROMアドレスを数値で直接参照するコード（@123; 0;JMP など）は想定しない。
+#       ジャンプ先は必ずラベル経由であること
+
+
+@dataclass
+class OptimizeReport:
+    before: int = 0
+    after: int = 0
+    removed: Counter = field(default_factory=Counter)
+
+    def __str__(self) -> str:
+        lines = [f"Optimized: {self.before} -> {self.after} instructions"]
+        for name, count in sorted(self.removed.items()):
+            lines.append(f"  {name}: -{count}")
+        return "\n".join(lines)
+
+
+def _count_instructions(instructions: list[Instruction]) -> int:
+    return sum(1 for i in instructions if i.type != InstructionType.L_INSTRUCTION)
+
+
+def _is_unconditional_jump(inst: Instruction) -> bool:
+    return (
+        inst.type == InstructionType.C_INSTRUCTION
+        and split_c_instruction(inst.text)[2] == "JMP"
+    )
+
+
+def remove_unreachable(
+    instructions: list[Instruction], report: OptimizeReport
+) -> list[Instruction]:
+    # 無条件ジャンプの後は次のラベルまで到達しない
+    result: list[Instruction] = []
+    reachable = True
+    for inst in instructions:
+        if inst.type == InstructionType.L_INSTRUCTION:
+            reachable = True
+        elif not reachable:
+            report.removed["unreachable"] += 1
+            continue
+        result.append(inst)
+        if _is_unconditional_jump(inst):
+            reachable = False
+    return result
+
+
+def remove_dead_loads(
+    instructions: list[Instruction], report: OptimizeReport
+) -> list[Instruction]:
+    # @X の直後（ラベルを挟んでもよい）に @Y が来るなら @X は使われない
+    result: list[Instruction] = []
+    pending: int | None = None
+    for inst in instructions:
+        if inst.type == InstructionType.A_INSTRUCTION:
+            if pending is not None:
+                del result[pending]
+                report.removed["dead A load"] += 1
+            pending = len(result)
+        elif inst.type == InstructionType.C_INSTRUCTION:
+            pending = None
+        result.append(inst)
+    return result
+
+
+def remove_redundant_loads(
+    instructions: list[Instruction], report: OptimizeReport
+) -> list[Instruction]:
+    # 同じアドレスを既に A に設定済みなら @X（と A=M）の再ロードは不要
+    result: list[Instruction] = []
+    # A に入っているシンボル（@X の直後）
+    loaded: str | None = None
+    # A=M で読み込んだポインタの元シンボル（@X; A=M の直後）
+    deref: str | None = None
+    skip_next = False
+    for index, inst in enumerate(instructions):
+        if skip_next:
+            skip_next = False
+            continue
+
+        if inst.type == InstructionType.L_INSTRUCTION:
+            loaded = deref = None
+        elif inst.type == InstructionType.A_INSTRUCTION:
+            if inst.text == loaded:
+                report.removed["redundant reload"] += 1
+                continue
+            following = instructions[index + 1 : index + 2]
+            if (
+                inst.text == deref
+                and following
+                and following[0].type == InstructionType.C_INSTRUCTION
+                and following[0].text == "A=M"
+            ):
+                report.removed["redundant reload"] += 2
+                skip_next = True
+                continue
+            loaded, deref = inst.text, None
+        else:
+            dest = split_c_instruction(inst.text)[0]
+            if inst.text == "A=M" and loaded is not None:
+                loaded, deref = None, loaded
+            elif "A" in dest:
+                loaded = deref = None
+            if "M" in dest:
+                # どこに書き込んだか分からないのでポインタは信用しない
+                deref = None
+        result.append(inst)
+    return result
+
+
+PASSES = (remove_unreachable, remove_dead_loads, remove_redundant_loads)
+
+
+def optimize(
+    instructions: list[Instruction],
+) -> tuple[list[Instruction], OptimizeReport]:
+    report = OptimizeReport(before=_count_instructions(instructions))
+    while True:
+        size = len(instructions)
+        for optimize_pass in PASSES:
+            instructions = optimize_pass(instructions, report)
+        if len(instructions) == size:
+            break
+    report.after = _count_instructions(instructions)
+    return instructions, report
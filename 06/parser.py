@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import Iterable, NamedTuple
 
 
 class InstructionType(Enum):
@@ -7,84 +8,115 @@ class InstructionType(Enum):
     L_INSTRUCTION = 3
 
 
+class Instruction(NamedTuple):
+    type: InstructionType
+    # A/L命令はシンボル、C命令は "dest=comp;jump" をそのまま保持する
+    text: str
+    # 元ソースでの行番号（1始まり）
+    lineno: int
+
+
+def classify(line: str) -> InstructionType:
+    if line[0] == "@":
+        return InstructionType.A_INSTRUCTION
+    elif line.startswith("(") and line.endswith(")"):
+        return InstructionType.L_INSTRUCTION
+    return InstructionType.C_INSTRUCTION
+
+
+def split_c_instruction(text: str) -> tuple[str, str, str]:
+    # "dest=comp;jump" を (dest, comp, jump) に分割する。省略部分は "null"
+    dest_part = "null"
+    jump_part = "null"
+    if ";" in text:
+        text, jump_part = text.split(";", 1)
+    if "=" in text:
+        dest_part, text = text.split("=", 1)
+    return dest_part, text, jump_part
+
+
+def parse_lines(lines: Iterable[str]) -> list[Instruction]:
+    # コメントと空白を除去し、命令種別を判定済みのリストにする
+    instructions: list[Instruction] = []
+    append = instructions.append
+    for lineno, line in enumerate(lines, 1):
+        cleaned = line.split("//", 1)[0].strip()
+        if not cleaned:
+            continue
+        inst_type = classify(cleaned)
+        if inst_type == InstructionType.A_INSTRUCTION:
+            cleaned = cleaned[1:]
+        elif inst_type == InstructionType.L_INSTRUCTION:
+            cleaned = cleaned.strip("()")
+        append(Instruction(inst_type, cleaned, lineno))
+    return instructions
+
+
+def read_instructions(filename: str) -> list[Instruction]:
+    # ファイルは一度にまとめて読み込む
+    with open(filename, "r") as f:
+        source = f.read()
+    return parse_lines(source.splitlines())
+
+
 # NOTE: ここでは文法的に良いかのチェックはしない
 class Parser:
     def __init__(self, filename: str) -> None:
         self.filename: str = filename
-        self.file = None
+        self.instructions: list[Instruction] = []
+        self.position: int = 0
+        self.current: Instruction | None = None
         self.current_line: str | None = None
 
     def hasMoreLines(self) -> bool:
-        pos = self.file.tell()
-        # １行読んでみる
-        line = self.file.readline()
-        # 元の位置へ戻す
-        self.file.seek(pos)
-        # line が空文字列(""＝EOF) でなければ True
-        return bool(line)
+        return self.position < len(self.instructions)
 
     def advance(self) -> None:
-        while True:
-            if not self.hasMoreLines():
-                # EOF
-                self.current_line = None
-                return None
-
-            line = self.file.readline()
-            # コメントと空白を除去
-            cleaned = line.split("//", 1)[0].strip()
-            if not cleaned:
-                # 空白行／コメントだけの行 → 次のループへ
-                continue
-
-            self.current_line = cleaned
+        if not self.hasMoreLines():
+            # EOF
+            self.current = None
+            self.current_line = None
             return None
 
+        self.current = self.instructions[self.position]
+        self.position += 1
+        if self.current.type == InstructionType.A_INSTRUCTION:
+            self.current_line = "@" + self.current.text
+        elif self.current.type == InstructionType.L_INSTRUCTION:
+            self.current_line = f"({self.current.text})"
+        else:
+            self.current_line = self.current.text
+        return None
+
     def instructionType(self) -> InstructionType:
-        if self.current_line[0] == "@":
-            return InstructionType.A_INSTRUCTION
-        elif self.current_line.startswith("(") and self.current_line.endswith(")"):
-            return InstructionType.L_INSTRUCTION
-        return InstructionType.C_INSTRUCTION
+        return self.current.type
 
     def symbol(self) -> str:
-        if self.instructionType() == InstructionType.A_INSTRUCTION:
-            return self.current_line[1:]
-        elif self.instructionType() == InstructionType.L_INSTRUCTION:
-            return self.current_line.strip("()")
-        else:
+        if self.current.type == InstructionType.C_INSTRUCTION:
             raise Exception()
+        return self.current.text
 
     def dest(self) -> str:
-        if self.instructionType() != InstructionType.C_INSTRUCTION:
+        if self.current.type != InstructionType.C_INSTRUCTION:
             raise Exception()
-        if "=" not in self.current_line:
-            return "null"
-        return self.current_line.split("=")[0]
+        return split_c_instruction(self.current.text)[0]
 
     def comp(self) -> str:
-        if self.instructionType() != InstructionType.C_INSTRUCTION:
+        if self.current.type != InstructionType.C_INSTRUCTION:
             raise Exception()
-
-        clean = self.current_line.split(";")[0]
-        if "=" in clean:
-            return clean.split("=")[1]
-        return clean
+        return split_c_instruction(self.current.text)[1]
 
     def jump(self) -> str:
-        if self.instructionType() != InstructionType.C_INSTRUCTION:
+        if self.current.type != InstructionType.C_INSTRUCTION:
             raise Exception()
-
-        if ";" not in self.current_line:
-            return "null"
-        return self.current_line.split(";")[1]
+        return split_c_instruction(self.current.text)[2]
 
     def close(self) -> None:
-        if hasattr(self, "file") and not self.file.closed:
-            self.file.close()
+        self.instructions = []
 
     def __enter__(self):
-        self.file = open(self.filename, "r")
+        self.instructions = read_instructions(self.filename)
+        self.position = 0
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -0,0 +1,83 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterable
+
+# ROMイメージ形式:
+#   ヘッダ (12バイト): マジック "HACK", バージョン(uint16), 予約(uint16), 命令数(uint32)
+#   本体: リトルエンディアンの uint16 配列
+ROM_MAGIC = b"HACK"
+ROM_VERSION = 1
+ROM_HEADER = struct.Struct("<4sHHI")
+ROM_SIZE = 32768
+
+
+def write_rom(filename: str, words: Iterable[int]) -> None:
+    data = array("H", words)
+    if len(data) > ROM_SIZE:
+        raise Exception(f"ROMに収まらない: {len(data)} words")
+    if sys.byteorder == "big":
+        data.byteswap()
+    with open(filename, "wb") as f:
+        f.write(ROM_HEADER.pack(ROM_MAGIC, ROM_VERSION, 0, len(data)))
+        data.tofile(f)
+
+
+class RomImage:
+    # ROMイメージを mmap で読み込み、32Kワードの ROM として参照する
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.file = open(filename, "rb")
+        # 空のファイルは mmap できないので、マップする前に大きさを確かめる
+        try:
+            if os.fstat(self.file.fileno()).st_size < ROM_HEADER.size:
+                raise Exception(f"ROMイメージではない: {filename}")
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self.file.close()
+            raise
+        magic, version, _, count = ROM_HEADER.unpack_from(self.map)
+        if magic != ROM_MAGIC or version != ROM_VERSION:
+            self.close()
+            raise Exception(f"ROMイメージではない: {filename}")
+        end = ROM_HEADER.size + count * 2
+        if count > ROM_SIZE or len(self.map) < end:
+            self.close()
+            raise Exception(f"ROMイメージが壊れている: {filename}")
+
+        self.size: int = count
+        if sys.byteorder == "little":
+            # コピーせずにそのまま uint16 として見る
+            self.words = memoryview(self.map)[ROM_HEADER.size : end].cast("H")
+        else:
+            swapped = array("H")
+            swapped.frombytes(self.map[ROM_HEADER.size : end])
+            swapped.byteswap()
+            self.words = memoryview(swapped)
+
+    def __len__(self) -> int:
+        return ROM_SIZE
+
+    def __getitem__(self, address: int) -> int:
+        if not 0 <= address < ROM_SIZE:
+            raise IndexError(address)
+        # 書き込まれていない領域は 0 として扱う
+        if address >= self.size:
+            return 0
+        return self.words[address]
+
+    def close(self) -> None:
+        if hasattr(self, "words"):
+            self.words.release()
+        if not self.map.closed:
+            self.map.close()
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -3,7 +3,7 @@
 set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
-ASSEMBLER="$SCRIPT_DIR/assembler.py"
+ASSEMBLER="$SCRIPT_DIR/batch_assembler.py"
 SAMPLE_SRC="$SCRIPT_DIR/sample"
 
 if [[ ! -d "$SAMPLE_SRC" ]]; then
@@ -14,24 +14,67 @@ fi
 TMP_ROOT="$(mktemp -d)"
 trap 'rm -rf "$TMP_ROOT"' EXIT
 
+# 生成した .hack をサンプルの .hack と比べる
+compare_outputs() {
+  local work_dir="$1"
+  for expected in "$SAMPLE_SRC"/*.hack; do
+    [[ -f "$expected" ]] || continue
+    generated="$work_dir/$(basename "$expected")"
+    if [[ ! -f "$generated" ]]; then
+      echo "Missing generated file: $generated" >&2
+      exit 1
+    fi
+    diff -u "$expected" "$generated"
+  done
+}
+
 WORK_SAMPLE="$TMP_ROOT/sample"
 cp -R "$SAMPLE_SRC" "$WORK_SAMPLE"
 
 find "$WORK_SAMPLE" -type f -name '*.hack' -delete
 
-for asm in "$WORK_SAMPLE"/*.asm; do
-  [[ -f "$asm" ]] || continue
-  python "$ASSEMBLER" "$asm"
+# 全ファイルを一つのプロセス（とワーカープール）でアセンブルする
+python "$ASSEMBLER" "$WORK_SAMPLE"
+compare_outputs "$WORK_SAMPLE"
+
+# --cache は1回目も2回目（キャッシュから）も同じ出力になる。
+# 1行だけのソースもソースとしてアセンブルする
+CACHE_SAMPLE="$TMP_ROOT/cache"
+cp -R "$SAMPLE_SRC" "$CACHE_SAMPLE"
+printf '// Prog.asm' >"$CACHE_SAMPLE/OneLine.asm"
+for run in 1 2; do
+  find "$CACHE_SAMPLE" -type f -name '*.hack' -delete
+  if ! python "$ASSEMBLER" --cache "$TMP_ROOT/asm_cache" "$CACHE_SAMPLE" \
+    >"$TMP_ROOT/cache.log"; then
+    grep -v "^OK\|^CACHE" "$TMP_ROOT/cache.log" >&2
+    exit 1
+  fi
+  compare_outputs "$CACHE_SAMPLE"
+  if [[ -s "$CACHE_SAMPLE/OneLine.hack" ]]; then
+    echo "Comment-only source produced instructions (run $run)" >&2
+    exit 1
+  fi
 done
 
+# --format rom の命令列はサンプルの .hack と同じになる
+ROM_SAMPLE="$TMP_ROOT/rom"
+cp -R "$SAMPLE_SRC" "$ROM_SAMPLE"
+python "$ASSEMBLER" --format rom "$ROM_SAMPLE" >/dev/null
 for expected in "$SAMPLE_SRC"/*.hack; do
   [[ -f "$expected" ]] || continue
-  generated="$WORK_SAMPLE/$(basename "$expected")"
-  if [[ ! -f "$generated" ]]; then
-    echo "Missing generated file: $generated" >&2
-    exit 1
-  fi
-  diff -u "$expected" "$generated"
+  rom_file="$ROM_SAMPLE/$(basename "${expected%.hack}").rom"
+  (cd "$SCRIPT_DIR" && python - "$rom_file" "$expected") <<'PY'
+import sys
+
+from rom_image import RomImage
+
+rom_file, hack_file = sys.argv[1:]
+with open(hack_file) as f:
+    expected = [int(line, 2) for line in f if line.strip()]
+with RomImage(rom_file) as image:
+    if list(image.words) != expected:
+        sys.exit(f"Mismatch: {rom_file} differs from {hack_file}")
+PY
 done
 
 echo "Assembler regression tests passed"
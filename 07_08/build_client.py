@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+from typing import BinaryIO
+
+# 常駐ビルドサーバー（build_server.py）にリクエストを送る薄いクライアント。
+# ツールチェーンのモジュールは読み込まないので、起動はすぐに終わる
+
+DEFAULT_SOCKET_PATH = os.path.join(
+    tempfile.gettempdir(), f"nand2tetris-build-{os.getuid()}.sock"
+)
+
+
+def send_message(stream: BinaryIO, message: dict) -> None:
+    # 1メッセージは JSON 1行
+    stream.write(json.dumps(message).encode() + b"\n")
+    stream.flush()
+
+
+def read_message(stream: BinaryIO) -> dict | None:
+    line = stream.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def request(message: dict, socket_path: str = DEFAULT_SOCKET_PATH) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile("rwb") as stream:
+            send_message(stream, message)
+            response = read_message(stream)
+    if response is None:
+        raise Exception("No response from build server")
+    return response
+
+
+def add_compile_arguments(arg_parser: argparse.ArgumentParser) -> None:
+    arg_parser.add_argument(
+        "--pool-strings",
+        action="store_true",
+        help="文字列定数をクラスごとに一度だけ作って使い回す",
+    )
+    arg_parser.add_argument(
+        "--fold-constants",
+        action="store_true",
+        help="定数式を畳み込み、定数との乗算を加算の列に展開する",
+    )
+
+
+def add_translate_arguments(arg_parser: argparse.ArgumentParser) -> None:
+    arg_parser.add_argument(
+        "--shared-routines",
+        action="store_true",
+        help="call/return/比較を共有ルーチンにしてコードサイズを減らす",
+    )
+    arg_parser.add_argument(
+        "--cache-tos",
+        action="store_true",
+        help="スタックトップを D レジスタに置いたまま変換する",
+    )
+    arg_parser.add_argument(
+        "--specialize",
+        action="store_true",
+        help="インデックスや定数に応じて命令数の少ないpush/popを選ぶ",
+    )
+    arg_parser.add_argument(
+        "--compact-prologue",
+        action="store_true",
+        help="ローカル変数の初期化をまとめて行い、多い場合は共有ループを使う",
+    )
+    arg_parser.add_argument(
+        "--prologue-loop-locals",
+        type=int,
+        default=None,
+        metavar="N",
+        help="共有の0埋めループを使うローカル変数の数（既定: vmtranslator と同じ）",
+    )
+    arg_parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="よく現れるVMコマンド列をまとめて変換する",
+    )
+    arg_parser.add_argument(
+        "--remove-unused",
+        action="store_true",
+        help="Sys.init から呼ばれない関数を出力しない",
+    )
+
+
+def add_assemble_arguments(arg_parser: argparse.ArgumentParser) -> None:
+    arg_parser.add_argument(
+        "--format",
+        choices=("hack", "rom"),
+        default="hack",
+        help="hack: テキスト形式 / rom: uint16 のバイナリROMイメージ",
+    )
+    arg_parser.add_argument(
+        "--optimize-asm",
+        action="store_true",
+        help="アセンブル前にASMレベルの最適化を行う",
+    )
+
+
+def build_message(args: argparse.Namespace) -> dict:
+    # サブコマンドの引数をそのままリクエストにする。パスはサーバーの
+    # カレントディレクトリによらないよう絶対パスにする
+    message = {
+        name: value
+        for name, value in vars(args).items()
+        if name not in ("socket", "path")
+    }
+    if getattr(args, "path", None) is not None:
+        message["path"] = os.path.abspath(args.path)
+    return message
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Build server client")
+    arg_parser.add_argument(
+        "--socket",
+        default=DEFAULT_SOCKET_PATH,
+        help="サーバーのUnixソケット（既定: %(default)s）",
+    )
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = commands.add_parser("compile", help=".jack を .vm にコンパイル")
+    compile_parser.add_argument("path", help="jack file or directory")
+    add_compile_arguments(compile_parser)
+
+    translate_parser = commands.add_parser("translate", help=".vm を .asm に変換")
+    translate_parser.add_argument("path", help="vm file or directory")
+    add_translate_arguments(translate_parser)
+
+    assemble_parser = commands.add_parser("assemble", help=".asm をアセンブル")
+    assemble_parser.add_argument("path", help="asm file")
+    add_assemble_arguments(assemble_parser)
+
+    build_parser = commands.add_parser(
+        "build", help="ディレクトリをコンパイル・変換・アセンブルする"
+    )
+    build_parser.add_argument("path", help="jack or vm directory")
+    add_compile_arguments(build_parser)
+    add_translate_arguments(build_parser)
+    add_assemble_arguments(build_parser)
+
+    commands.add_parser("stats", help="サーバーのキャッシュの状態を表示")
+    commands.add_parser("shutdown", help="サーバーを終了する")
+    args = arg_parser.parse_args()
+
+    try:
+        response = request(build_message(args), args.socket)
+    except OSError as e:
+        print(f"Error: build server is not running on {args.socket} ({e})")
+        sys.exit(1)
+
+    for line in response.get("output", []):
+        print(line)
+    if not response.get("ok"):
+        print(f"Error: {response.get('error')}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
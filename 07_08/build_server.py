@@ -0,0 +1,367 @@
+import argparse
+import os
+import socket
+import socketserver
+import time
+from collections import Counter
+from types import ModuleType
+from typing import Any, Callable
+
+from build_client import (
+    DEFAULT_SOCKET_PATH,
+    add_assemble_arguments,
+    add_compile_arguments,
+    add_translate_arguments,
+    build_message,
+    read_message,
+    send_message,
+)
+from codewriter import CodegenOptions, CodeWriter
+from hack_build import load_assembler, load_isolated
+from parser import Command, read_commands
+from vm_dead_code import DeadFunctionReport
+from vm_optimizer import format_hits
+from vmtranslator import collect_vm_files, translate_all
+
+# ツールチェーンを読み込んだまま常駐し、Unixソケットでビルドのリクエストを受ける。
+# 読み込んだソース（トークン列・コマンド列・命令列）は更新時刻が変わるまで使い回す
+
+COMPILER_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "10_11"
+)
+# 10_11 のコンパイラを構成するモジュール
+COMPILER_MODULES = (
+    "char_code",
+    "symbol",
+    "jack_tokenizer",
+    "vm_writer",
+    "constant_fold",
+    "compilation_engine",
+    "compile_cache",
+    "jack_analyzer",
+)
+# リクエストを待つ間隔（秒）。監視するディレクトリもこの間隔で調べる
+DEFAULT_POLL_INTERVAL = 0.5
+WATCHED_SUFFIXES = (".jack", ".vm")
+
+
+def load_compiler() -> dict[str, ModuleType]:
+    return load_isolated(COMPILER_DIR, COMPILER_MODULES, "jack_analyzer")
+
+
+class SourceCache:
+    # パス -> (更新時刻, サイズ, 読み込んだ結果)。ファイルが変わったら読み直す
+    def __init__(self) -> None:
+        self.entries: dict[str, tuple[int, int, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str, load: Callable[[str], Any]) -> Any:
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            self.hits += 1
+            return entry[2]
+
+        self.misses += 1
+        value = load(path)
+        self.entries[path] = (stat.st_mtime_ns, stat.st_size, value)
+        return value
+
+    def prune(self) -> int:
+        # 消えたファイルのエントリを捨てる
+        missing = [path for path in self.entries if not os.path.exists(path)]
+        for path in missing:
+            del self.entries[path]
+        return len(missing)
+
+
+class DirectoryWatcher:
+    # ディレクトリ内の .jack / .vm の更新時刻を覚えておき、変わったものを返す
+    def __init__(self, directory: str) -> None:
+        self.directory = os.path.abspath(directory)
+        # 最初の changes() ですべてのファイルをビルドする
+        self.stamps: dict[str, int] = {}
+
+    def scan(self) -> dict[str, int]:
+        stamps = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith(WATCHED_SUFFIXES):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stamps[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+        return stamps
+
+    def changes(self) -> list[str]:
+        stamps = self.scan()
+        changed = sorted(
+            path for path, stamp in stamps.items() if self.stamps.get(path) != stamp
+        )
+        removed = self.stamps.keys() - stamps.keys()
+        self.stamps = stamps
+        if removed and not changed:
+            # ファイルが消えただけでも出力は変わる
+            changed = [self.directory]
+        return changed
+
+    def rescan(self) -> None:
+        # ビルドで書き出した .vm を変更として扱わないようにする
+        self.stamps = self.scan()
+
+
+class BuildServer:
+    def __init__(self) -> None:
+        self.compiler = load_compiler()
+        self.assembler = load_assembler()
+        self.sources = SourceCache()
+        self.requests: Counter = Counter()
+        self.started = time.time()
+        self.running = True
+        self.handlers: dict[str, Callable[[dict], tuple[bool, list[str]]]] = {
+            "compile": self.compile,
+            "translate": self.translate,
+            "assemble": self.assemble,
+            "build": self.build,
+            "stats": self.stats,
+            "shutdown": self.shutdown,
+        }
+
+    def handle(self, message: dict) -> dict:
+        command = message.get("command")
+        handler = self.handlers.get(command)
+        if handler is None:
+            return {"ok": False, "output": [], "error": f"Unknown command: {command}"}
+
+        self.requests[command] += 1
+        start = time.perf_counter()
+        try:
+            ok, output = handler(message)
+        except Exception as e:
+            return {"ok": False, "output": [], "error": str(e)}
+        elapsed = time.perf_counter() - start
+        output.append(f"{command} finished in {elapsed * 1000:.1f} ms")
+        return {"ok": ok, "output": output, "error": None if ok else "Build failed"}
+
+    def compileFiles(
+        self, jack_files: list[str], message: dict
+    ) -> tuple[bool, list[str]]:
+        # ファイルごとのエラーは出力に記録し、残りのファイルのコンパイルは続ける
+        jack_analyzer = self.compiler["jack_analyzer"]
+        tokenize_file = self.compiler["jack_tokenizer"].tokenize_file
+        pool_strings = message.get("pool_strings", False)
+        fold_constants = message.get("fold_constants", False)
+        ok = True
+        output = []
+        for jack_path in jack_files:
+            try:
+                tokenized = self.sources.get(jack_path, tokenize_file)
+                jack_analyzer.compile_file(
+                    jack_path, pool_strings, None, tokenized, fold_constants
+                )
+            except Exception as e:
+                ok = False
+                output.append(f"Error: {jack_path}: {e}")
+                continue
+            output.append(f"Compiled: {jack_path}")
+        return ok, output
+
+    def readCommands(self, vm_path: str) -> list[Command]:
+        return self.sources.get(vm_path, read_commands)
+
+    def translatePath(self, path: str, message: dict) -> tuple[str, list[str]]:
+        # 出力した .asm のパスと、表示するメッセージを返す
+        # 指定がなければ vmtranslator と同じ既定値を使う
+        prologue_loop_locals = message.get("prologue_loop_locals")
+        if prologue_loop_locals is None:
+            prologue_loop_locals = CodegenOptions.prologue_loop_locals
+        options = CodegenOptions(
+            shared_routines=message.get("shared_routines", False),
+            cache_tos=message.get("cache_tos", False),
+            specialize=message.get("specialize", False),
+            compact_prologue=message.get("compact_prologue", False),
+            prologue_loop_locals=prologue_loop_locals,
+        )
+        peephole_hits = Counter() if message.get("optimize") else None
+        dead_functions = DeadFunctionReport() if message.get("remove_unused") else None
+        vm_files, output_file = collect_vm_files(path)
+        with CodeWriter(
+            output_file, os.path.basename(vm_files[0]), options
+        ) as code_writer:
+            translate_all(
+                code_writer,
+                vm_files,
+                peephole_hits,
+                dead_functions=dead_functions,
+                read=self.readCommands,
+            )
+
+        output = [f"Translation completed: {output_file}"]
+        if peephole_hits is not None:
+            output.append(format_hits(peephole_hits))
+        if dead_functions is not None:
+            output.append(str(dead_functions))
+        return output_file, output
+
+    def assemblePath(self, asm_file: str, message: dict) -> list[str]:
+        assembler = self.assembler
+        output_format = message.get("format", "hack")
+        instructions = self.sources.get(asm_file, assembler.read_instructions)
+        assembly = assembler.Assembly(instructions, message.get("optimize_asm", False))
+        words = assembly.words()
+        output_file = assembler.output_filename(asm_file, output_format)
+        assembler.write_output(output_file, words, output_format)
+
+        output = [f"Assembled: {output_file} ({len(words)} words)"]
+        if assembly.report is not None:
+            output.append(str(assembly.report))
+        return output
+
+    def buildDirectory(
+        self, directory: str, message: dict, jack_files: list[str]
+    ) -> tuple[bool, list[str]]:
+        # .jack をコンパイルしてから、ディレクトリの .vm をまとめて変換・アセンブルする
+        ok, output = self.compileFiles(jack_files, message)
+        if not ok:
+            return ok, output
+        asm_file, translated = self.translatePath(directory, message)
+        output += translated
+        output += self.assemblePath(asm_file, message)
+        return ok, output
+
+    def compile(self, message: dict) -> tuple[bool, list[str]]:
+        jack_files = self.compiler["jack_analyzer"].collect_jack_files(message["path"])
+        return self.compileFiles(jack_files, message)
+
+    def translate(self, message: dict) -> tuple[bool, list[str]]:
+        _, output = self.translatePath(message["path"], message)
+        return True, output
+
+    def assemble(self, message: dict) -> tuple[bool, list[str]]:
+        return True, self.assemblePath(message["path"], message)
+
+    def build(self, message: dict) -> tuple[bool, list[str]]:
+        directory = message["path"]
+        if not os.path.isdir(directory):
+            raise Exception("Please specify a directory")
+        jack_files = [
+            os.path.join(directory, name)
+            for name in sorted(os.listdir(directory))
+            if name.endswith(".jack")
+        ]
+        return self.buildDirectory(directory, message, jack_files)
+
+    def stats(self, message: dict) -> tuple[bool, list[str]]:
+        pruned = self.sources.prune()
+        requests = ", ".join(
+            f"{command}: {count}" for command, count in sorted(self.requests.items())
+        )
+        return True, [
+            f"Uptime: {time.time() - self.started:.0f}s",
+            f"Requests: {requests}",
+            f"Cached sources: {len(self.sources.entries)}"
+            f" ({self.sources.hits} hits, {self.sources.misses} misses,"
+            f" {pruned} pruned)",
+        ]
+
+    def shutdown(self, message: dict) -> tuple[bool, list[str]]:
+        self.running = False
+        return True, ["Build server is shutting down"]
+
+    def rebuildWatched(self, watcher: DirectoryWatcher, message: dict) -> None:
+        changed = watcher.changes()
+        if not changed:
+            return
+        jack_files = [path for path in changed if path.endswith(".jack")]
+        start = time.perf_counter()
+        try:
+            ok, output = self.buildDirectory(watcher.directory, message, jack_files)
+        except Exception as e:
+            ok, output = False, [f"Error: {e}"]
+        watcher.rescan()
+        elapsed = time.perf_counter() - start
+        status = "Rebuilt" if ok else "Rebuild failed"
+        output.append(f"{status}: {watcher.directory} ({elapsed * 1000:.1f} ms)")
+        print("\n".join(output), flush=True)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        message = read_message(self.rfile)
+        if message is None:
+            return
+        send_message(self.wfile, self.server.build_server.handle(message))
+
+
+def remove_stale_socket(socket_path: str) -> None:
+    # 前回のサーバーが残したソケットファイルを消す。動いているサーバーがあればエラー
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            os.remove(socket_path)
+            return
+    raise Exception(f"Build server is already running on {socket_path}")
+
+
+def serve(
+    socket_path: str = DEFAULT_SOCKET_PATH,
+    watch_dirs: list[str] | None = None,
+    watch_message: dict | None = None,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+) -> None:
+    # リクエストは1つずつ順に処理するので、キャッシュや sys.modules を
+    # 複数のリクエストが同時に触ることはない
+    build_server = BuildServer()
+    watchers = [DirectoryWatcher(directory) for directory in watch_dirs or []]
+    remove_stale_socket(socket_path)
+    with socketserver.UnixStreamServer(socket_path, RequestHandler) as server:
+        server.build_server = build_server
+        server.timeout = poll_interval
+        print(f"Build server listening on {socket_path}", flush=True)
+        try:
+            while build_server.running:
+                for watcher in watchers:
+                    build_server.rebuildWatched(watcher, watch_message or {})
+                server.handle_request()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Build server")
+    arg_parser.add_argument(
+        "--socket",
+        default=DEFAULT_SOCKET_PATH,
+        help="待ち受けるUnixソケット（既定: %(default)s）",
+    )
+    arg_parser.add_argument(
+        "--watch",
+        action="append",
+        default=[],
+        metavar="DIR",
+        help="ディレクトリの .jack / .vm が変わるたびにビルドする（複数指定可）",
+    )
+    arg_parser.add_argument(
+        "--interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help="監視の間隔（秒、既定: %(default)s）",
+    )
+    add_compile_arguments(arg_parser)
+    add_translate_arguments(arg_parser)
+    add_assemble_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    # 監視でのビルドには、コマンドラインのビルドオプションを使う
+    serve(args.socket, args.watch, build_message(args), args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,35 @@
+from dataclasses import dataclass
 from typing import Literal
-from parser import CommandType
+from parser import ArithmeticOp, Command, CommandType
+from vm_optimizer import FusedCommand
 import os
 
 
 CALC_COMMAND = {
-    "add": ["@SP", "AM=M-1", "D=M", "A=A-1", "M=D+M"],
-    "sub": ["@SP", "AM=M-1", "D=M", "A=A-1", "M=M-D"],
-    "neg": ["@SP", "A=M-1", "M=-M"],
-    "and": ["@SP", "AM=M-1", "D=M", "A=A-1", "M=D&M"],
-    "or": ["@SP", "AM=M-1", "D=M", "A=A-1", "M=D|M"],
-    "not": ["@SP", "A=M-1", "M=!M"],
+    ArithmeticOp.ADD: ["@SP", "AM=M-1", "D=M", "A=A-1", "M=D+M"],
+    ArithmeticOp.SUB: ["@SP", "AM=M-1", "D=M", "A=A-1", "M=M-D"],
+    ArithmeticOp.NEG: ["@SP", "A=M-1", "M=-M"],
+    ArithmeticOp.AND: ["@SP", "AM=M-1", "D=M", "A=A-1", "M=D&M"],
+    ArithmeticOp.OR: ["@SP", "AM=M-1", "D=M", "A=A-1", "M=D|M"],
+    ArithmeticOp.NOT: ["@SP", "A=M-1", "M=!M"],
 }
 
-COMPARE_COMMAND = {"eq": "JEQ", "gt": "JGT", "lt": "JLT"}
+COMPARE_COMMAND = {
+    ArithmeticOp.EQ: "JEQ",
+    ArithmeticOp.GT: "JGT",
+    ArithmeticOp.LT: "JLT",
+}
+
+# 比較結果が偽のときに分岐するジャンプ（compare; not; if-goto 用）
+NEGATED_JUMP = {"JEQ": "JNE", "JGT": "JLE", "JLT": "JGE"}
+
+# スタックトップ（M）と D の二項演算
+BINARY_COMP = {
+    ArithmeticOp.ADD: "D+M",
+    ArithmeticOp.SUB: "M-D",
+    ArithmeticOp.AND: "D&M",
+    ArithmeticOp.OR: "D|M",
+}
 
 # メモリセグメントの基底アドレス
 FIXED_MEMORY_SEGMENT = {
@@ -26,31 +43,135 @@ PUSH_ASM = ["@SP", "A=M", "M=D", "@SP", "M=M+1"]
 
 POP_ASM = ["@SP", "AM=M-1", "D=M"]
 
+# D をプッシュする4命令版（SP を先に進めてから一つ前に書く）
+SHORT_PUSH_ASM = ["@SP", "AM=M+1", "A=A-1", "M=D"]
+
+# cache_tos モードで D に置いたスタックトップをメモリに書き戻す
+FLUSH_TOS_ASM = SHORT_PUSH_ASM
+
+# specialize で直接書き込める定数（comp に定数として書ける値）
+SMALL_CONSTANTS = {0: "0", 1: "1"}
+
+# D（スタックトップ）に対する単項演算
+UNARY_COMP = {ArithmeticOp.NEG: "-D", ArithmeticOp.NOT: "!D"}
+
+# 共有ルーチンのラベル（VMの関数名は "Class.name" 形式なので衝突しない）
+CALL_ROUTINE = "__CALL"
+RETURN_ROUTINE = "__RETURN"
+COMPARE_ROUTINE = {"JEQ": "__EQ", "JGT": "__GT", "JLT": "__LT"}
+ZERO_FILL_ROUTINE = "__ZERO_LOCALS"
+
+# local_labels のときにブートストラップが使うラベルの名前空間
+BOOTSTRAP_NAMESPACE = "__BOOT"
+
+
+@dataclass(frozen=True)
+class CodegenOptions:
+    # call/return/比較を共有ルーチンへのジャンプで出力する
+    shared_routines: bool = False
+    # 生成ラベルの番号をファイルごとに振り直し、ファイル名で修飾する。
+    # 各ファイルの出力が他のファイルに依存しなくなるので並列に変換できる
+    local_labels: bool = False
+    # スタックトップを D レジスタに置いたまま直線的なコマンド列を変換する
+    cache_tos: bool = False
+    # インデックスや定数ごとに命令数の少ない列を選ぶ
+    specialize: bool = False
+    # ローカル変数の初期化で SP を最後にまとめて進める
+    compact_prologue: bool = False
+    # compact_prologue でローカル変数がこの数以上なら共有の0埋めループを呼ぶ
+    prologue_loop_locals: int = 8
+
+
+def _offset_address(base: str, index: int) -> list[str]:
+    # A = RAM[base] + index を A=M+1 の連鎖で求める（D を壊さない）
+    if index == 0:
+        return [f"@{base}", "A=M"]
+    return [f"@{base}", "A=M+1"] + ["A=A+1"] * (index - 1)
+
+
+def _cheapest(*candidates: list[str]) -> list[str]:
+    # 命令数（ラベルを除く）が最小の候補を選ぶ。同数なら先の候補
+    return min(
+        candidates,
+        key=lambda asm: sum(1 for line in asm if not line.startswith("(")),
+    )
+
 
 class CodeWriter:
-    def __init__(self, output_file: str, fileName: str):
+    def __init__(
+        self,
+        output_file: str | None,
+        fileName: str,
+        options: CodegenOptions | None = None,
+    ):
+        self.closed = False
         self.output_file = output_file
-        self.file = open(output_file, "w")
+        # output_file が None のときはファイルに書かず self.lines に溜める
+        self.file = open(output_file, "w") if output_file is not None else None
+        self.lines: list[str] = []
+        self.options = options or CodegenOptions()
         self.label_counter = 0
         self.return_counter = 0
         self.currentFile, _ = os.path.splitext(fileName)
         self.currentFunction = None
+        # 使われた共有ルーチン（close() でまとめて出力する）
+        self.used_routines: set[str] = set()
+        # cache_tos モードでスタックトップが D にだけある（メモリにない）か
+        self.tos_cached = False
+        # コマンド種別ごとの出力処理
+        self.handlers = {
+            CommandType.C_ARITHMETIC: lambda c: self.writeArithmetic(c.arg1),
+            CommandType.C_PUSH: lambda c: self.writePushPop(c.type, c.arg1, c.arg2),
+            CommandType.C_POP: lambda c: self.writePushPop(c.type, c.arg1, c.arg2),
+            CommandType.C_LABEL: lambda c: self.writeLabel(c.arg1),
+            CommandType.C_GOTO: lambda c: self.writeGoto(c.arg1),
+            CommandType.C_IF: lambda c: self.writeIf(c.arg1),
+            CommandType.C_FUNCTION: lambda c: self.writeFunction(c.arg1, c.arg2),
+            CommandType.C_CALL: lambda c: self.writeCall(c.arg1, c.arg2),
+            CommandType.C_RETURN: lambda c: self.writeReturn(),
+        }
+        # 算術コマンドごとの出力処理（スタックトップがメモリにある場合）
+        self.arithmetic_handlers = {
+            **{op: self.writeCalc for op in CALC_COMMAND},
+            **{op: self.writeCompare for op in COMPARE_COMMAND},
+        }
+
+    def writeCommand(self, command: Command) -> None:
+        handler = self.handlers.get(command.type)
+        if handler is None:
+            raise Exception(f"Unsupported command: {command.text}")
+        handler(command)
 
     def writeBootstrap(self) -> None:
+        if self.options.local_labels:
+            self.setFileName(BOOTSTRAP_NAMESPACE)
         self.write(["@256", "D=A", "@SP", "M=D"])
         self.writeCall("Sys.init", 0)
 
-    def writeArithmetic(self, command: str) -> None:
-        if command in CALC_COMMAND:
-            self.write(CALC_COMMAND[command])
-        elif command in COMPARE_COMMAND:
-            self.write(self.compareAsm(COMPARE_COMMAND[command]))
+    def writeArithmetic(self, command: ArithmeticOp) -> None:
+        if self.options.cache_tos and not (
+            command in COMPARE_COMMAND and self.options.shared_routines
+        ):
+            self.write(self.cachedArithmeticAsm(command))
+            return
+        handler = self.arithmetic_handlers.get(command)
+        if handler is None:
+            raise Exception(f"Unsupported arithmetic command: {command}")
+        self.flushTos()
+        handler(command)
+
+    def writeCalc(self, command: ArithmeticOp) -> None:
+        self.write(CALC_COMMAND[command])
+
+    def writeCompare(self, command: ArithmeticOp) -> None:
+        if self.options.shared_routines:
+            self.write(self.sharedCompareAsm(COMPARE_COMMAND[command]))
         else:
-            raise Exception()
+            self.write(self.compareAsm(COMPARE_COMMAND[command]))
 
     def compareAsm(self, jump: str) -> list[str]:
-        label_true = f"COMP_TRUE_{self.label_counter}"
-        label_end = f"COMP_END_{self.label_counter}"
+        label_true = self._generatedLabel(f"COMP_TRUE_{self.label_counter}")
+        label_end = self._generatedLabel(f"COMP_END_{self.label_counter}")
         self.label_counter += 1
         return [
             "@SP",
@@ -72,12 +193,26 @@ class CodeWriter:
             f"({label_end})",
         ]
 
+    def sharedCompareAsm(self, jump: str) -> list[str]:
+        # 戻り先を D に入れて共有の比較ルーチンへ飛ぶ
+        routine = COMPARE_ROUTINE[jump]
+        self.used_routines.add(routine)
+        label_ret = self._generatedLabel(f"COMP_RET_{self.label_counter}")
+        self.label_counter += 1
+        return [f"@{label_ret}", "D=A", f"@{routine}", "0;JMP", f"({label_ret})"]
+
     def writePushPop(
         self,
         commandType: Literal[CommandType.C_POP, CommandType.C_PUSH],
         segment: str,
         index: int,
     ) -> None:
+        if self.options.cache_tos:
+            if commandType == CommandType.C_PUSH:
+                self.write(self.cachedPushAsm(segment, index))
+            else:
+                self.write(self.cachedPopAsm(segment, index))
+            return
         if commandType == CommandType.C_PUSH:
             self.write(self.pushAsm(segment, index))
         elif commandType == CommandType.C_POP:
@@ -85,37 +220,61 @@ class CodeWriter:
 
     def pushAsm(self, segment: str, index: int) -> list[str]:
         # 指定されたセグメントの値をスタックにプッシュするASMコードを生成
+        if not self.options.specialize:
+            return self.loadAsm(segment, index) + PUSH_ASM
+        if segment == "constant" and index in SMALL_CONSTANTS:
+            return SHORT_PUSH_ASM[:-1] + [f"M={SMALL_CONSTANTS[index]}"]
+        return self.loadAsm(segment, index) + SHORT_PUSH_ASM
+
+    def loadAsm(self, segment: str, index: int) -> list[str]:
+        # 指定されたセグメントの値を D レジスタに読み込むASMを生成
         if segment in FIXED_MEMORY_SEGMENT:
             base = FIXED_MEMORY_SEGMENT[segment]
-            return [
+            generic = [
                 f"@{index}",
                 "D=A",
                 f"@{base}",
                 "A=D+M",
                 "D=M",
-            ] + PUSH_ASM
+            ]
+            if self.options.specialize:
+                return _cheapest(generic, _offset_address(base, index) + ["D=M"])
+            return generic
         elif segment == "pointer":
             if index > 1:
                 raise Exception()
             base = "THIS" if index == 0 else "THAT"
-            return [f"@{base}", "D=M"] + PUSH_ASM
+            return [f"@{base}", "D=M"]
         elif segment == "temp":
             if index > 7:
                 raise Exception()
-            return [f"@{5 + index}", "D=M"] + PUSH_ASM
+            return [f"@{5 + index}", "D=M"]
 
         elif segment == "constant":
-            return [f"@{index}", "D=A"] + PUSH_ASM
+            if self.options.specialize and index in SMALL_CONSTANTS:
+                return [f"D={SMALL_CONSTANTS[index]}"]
+            return [f"@{index}", "D=A"]
         elif segment == "static":
-            return [f"@{self.currentFile}.{index}", "D=M"] + PUSH_ASM
+            return [f"@{self.currentFile}.{index}", "D=M"]
         else:
             raise Exception(f"Unsupported segment: {segment}")
 
     def popAsm(self, segment: str, index: int) -> list[str]:
         # スタックからポップした値を指定されたセグメントに格納するASMを生成
+        store = self.storeAsm(segment, index, POP_ASM)
+        if self.options.specialize and segment in FIXED_MEMORY_SEGMENT:
+            # D = アドレス + 値 として、作業用レジスタなしで書き込む
+            base = FIXED_MEMORY_SEGMENT[segment]
+            in_place = [f"@{index}", "D=A", f"@{base}", "D=D+M"]
+            in_place += ["@SP", "AM=M-1", "D=D+M", "A=D-M", "M=D-A"]
+            return _cheapest(store, in_place)
+        return store
+
+    def storeAsm(self, segment: str, index: int, value: list[str]) -> list[str]:
+        # value で D に入れた値を指定されたセグメントに格納するASMを生成
         if segment in FIXED_MEMORY_SEGMENT:
             base = FIXED_MEMORY_SEGMENT[segment]
-            return (
+            generic = (
                 [
                     f"@{index}",
                     "D=A",
@@ -124,34 +283,127 @@ class CodeWriter:
                     "@R13",
                     "M=D",
                 ]
-                + POP_ASM
+                + value
                 + ["@R13", "A=M", "M=D"]
             )
+            if self.options.specialize:
+                offset = value + _offset_address(base, index) + ["M=D"]
+                return _cheapest(generic, offset)
+            return generic
         elif segment == "pointer":
             if index > 1:
                 raise Exception()
             base = "THIS" if index == 0 else "THAT"
-            return POP_ASM + [f"@{base}", "M=D"]
+            return value + [f"@{base}", "M=D"]
         elif segment == "temp":
             if index > 7:
                 raise Exception()
-            return POP_ASM + [f"@{5 + index}", "M=D"]
+            return value + [f"@{5 + index}", "M=D"]
         elif segment == "static":
-            return POP_ASM + [f"@{self.currentFile}.{index}", "M=D"]
+            return value + [f"@{self.currentFile}.{index}", "M=D"]
         else:
             raise Exception(
                 f"Unsupported segment: {segment} (constant cannot be popped)"
             )
 
+    def flushTos(self) -> None:
+        # ラベル・ジャンプ・call・関数境界の前ではスタックをメモリ上に揃える
+        if self.tos_cached:
+            self.write(FLUSH_TOS_ASM)
+            self.tos_cached = False
+
+    def cachedPushAsm(self, segment: str, index: int) -> list[str]:
+        # 直前のスタックトップを書き戻し、新しい値を D に読み込むだけにする
+        asm = FLUSH_TOS_ASM if self.tos_cached else []
+        self.tos_cached = True
+        return asm + self.loadAsm(segment, index)
+
+    def cachedPopAsm(self, segment: str, index: int) -> list[str]:
+        if not self.tos_cached:
+            return self.popAsm(segment, index)
+        self.tos_cached = False
+        if segment in FIXED_MEMORY_SEGMENT:
+            # アドレス計算で D を使うので値は R14 に退避する
+            saved = ["@R14", "M=D"] + self.storeAsm(segment, index, ["@R14", "D=M"])
+            if self.options.specialize:
+                base = FIXED_MEMORY_SEGMENT[segment]
+                return _cheapest(saved, _offset_address(base, index) + ["M=D"])
+            return saved
+        return self.storeAsm(segment, index, [])
+
+    def cachedArithmeticAsm(self, command: ArithmeticOp) -> list[str]:
+        # 演算結果は D に残し、メモリには書き戻さない
+        if command in UNARY_COMP:
+            asm = [] if self.tos_cached else POP_ASM
+            self.tos_cached = True
+            return asm + [f"D={UNARY_COMP[command]}"]
+
+        # y を D に、x をメモリから取り出す
+        asm = ([] if self.tos_cached else POP_ASM) + ["@SP", "AM=M-1"]
+        self.tos_cached = True
+        if command in BINARY_COMP:
+            return asm + [f"D={BINARY_COMP[command]}"]
+        if command not in COMPARE_COMMAND:
+            raise Exception()
+        label_true = self._generatedLabel(f"COMP_TRUE_{self.label_counter}")
+        label_end = self._generatedLabel(f"COMP_END_{self.label_counter}")
+        self.label_counter += 1
+        return asm + [
+            "D=M-D",
+            f"@{label_true}",
+            f"D;{COMPARE_COMMAND[command]}",
+            "D=0",
+            f"@{label_end}",
+            "0;JMP",
+            f"({label_true})",
+            "D=-1",
+            f"({label_end})",
+        ]
+
+    def writeFused(self, fused: FusedCommand) -> None:
+        commands = fused.commands
+        if fused.pattern == "push-pop-same":
+            # 同じ場所への push/pop は何もしない
+            return
+        self.flushTos()
+        if fused.pattern == "push-pop":
+            push, pop = commands
+            value = self.loadAsm(push.arg1, push.arg2)
+            self.write(self.storeAsm(pop.arg1, pop.arg2, value))
+        elif fused.pattern == "push-binary":
+            push, op = commands
+            self.write(
+                self.loadAsm(push.arg1, push.arg2)
+                + ["@SP", "A=M-1", f"M={BINARY_COMP[op.arg1]}"]
+            )
+        elif fused.pattern in ("compare-if", "compare-not-if"):
+            jump = COMPARE_COMMAND[commands[0].arg1]
+            if fused.pattern == "compare-not-if":
+                jump = NEGATED_JUMP[jump]
+            label = self._scopedLabel(commands[-1].arg1)
+            self.write(
+                POP_ASM + ["@SP", "AM=M-1", "D=M-D", f"@{label}", f"D;{jump}"]
+            )
+        elif fused.pattern == "not-if":
+            # not x が 0 以外 <=> x != -1（true 以外の値でも分岐する）
+            label = self._scopedLabel(commands[-1].arg1)
+            self.write(POP_ASM + ["D=D+1", f"@{label}", "D;JNE"])
+        else:
+            raise Exception(f"Unsupported fused pattern: {fused.pattern}")
+
     def writeLabel(self, label: str) -> None:
+        self.flushTos()
         self.write([f"({self._scopedLabel(label)})"])
 
     def writeGoto(self, label: str) -> None:
+        self.flushTos()
         self.write([f"@{self._scopedLabel(label)}", "0;JMP"])
 
     def writeIf(self, label: str) -> None:
-        asm = POP_ASM + [f"@{self._scopedLabel(label)}", "D;JNE"]
-        self.write(asm)
+        # cache_tos で条件が D にあればポップは不要
+        asm = [] if self.tos_cached else POP_ASM
+        self.tos_cached = False
+        self.write(asm + [f"@{self._scopedLabel(label)}", "D;JNE"])
 
     def _scopedLabel(self, label: str) -> str:
         if self.currentFunction:
@@ -159,13 +411,71 @@ class CodeWriter:
         return f"{self.currentFile}${label}"
 
     def writeFunction(self, functionName: str, nArgs: int) -> None:
+        self.flushTos()
         self.currentFunction = functionName
         self.write([f"({functionName})"])
+        if self.options.compact_prologue:
+            self.write(self.prologueAsm(nArgs))
+            return
         for _ in range(nArgs):
             self.writePushPop(CommandType.C_PUSH, "constant", 0)
 
+    def prologueAsm(self, nLocals: int) -> list[str]:
+        # ローカル変数を0で初期化する。展開すると 2k+4 命令、ループは呼び出し8命令
+        if nLocals == 0:
+            return []
+        if nLocals == 1:
+            return SHORT_PUSH_ASM[:-1] + ["M=0"]
+        if nLocals >= self.options.prologue_loop_locals:
+            # R13 = 戻り先, D = 個数 で共有の0埋めループへ飛ぶ
+            self.used_routines.add(ZERO_FILL_ROUTINE)
+            label_ret = self._generatedLabel(f"ZERO_RET_{self.label_counter}")
+            self.label_counter += 1
+            return [
+                f"@{label_ret}",
+                "D=A",
+                "@R13",
+                "M=D",
+                f"@{nLocals}",
+                "D=A",
+                f"@{ZERO_FILL_ROUTINE}",
+                "0;JMP",
+                f"({label_ret})",
+            ]
+        # SP の先に0を並べて書き、最後に SP を一度だけ進める
+        asm = ["@SP", "A=M", "M=0"]
+        for _ in range(nLocals - 1):
+            asm += ["A=A+1", "M=0"]
+        return asm + ["D=A+1", "@SP", "M=D"]
+
+    def zeroFillRoutineAsm(self) -> list[str]:
+        loop = f"{ZERO_FILL_ROUTINE}_LOOP"
+        return [
+            f"({ZERO_FILL_ROUTINE})",
+            f"({loop})",
+            "@SP",
+            "AM=M+1",
+            "A=A-1",
+            "M=0",
+            "D=D-1",
+            f"@{loop}",
+            "D;JGT",
+            "@R13",
+            "A=M",
+            "0;JMP",
+        ]
+
     def writeCall(self, functionName: str, nArgs: int) -> None:
+        self.flushTos()
         retLabel = self._returnAddrLabel(functionName)
+        if self.options.shared_routines:
+            # R13 = nArgs+5, R14 = 呼び出し先, D = 戻り先
+            self.used_routines.add(CALL_ROUTINE)
+            self.write([f"@{nArgs + 5}", "D=A", "@R13", "M=D"])
+            self.write([f"@{functionName}", "D=A", "@R14", "M=D"])
+            self.write([f"@{retLabel}", "D=A", f"@{CALL_ROUTINE}", "0;JMP"])
+            self.write([f"({retLabel})"])
+            return
         self.write([f"@{retLabel}", "D=A"] + PUSH_ASM)
         self.write(["@LCL", "D=M"] + PUSH_ASM)
         self.write(["@ARG", "D=M"] + PUSH_ASM)
@@ -181,37 +491,117 @@ class CodeWriter:
         self.write([f"({retLabel})"])
 
     def writeReturn(self) -> None:
+        self.flushTos()
+        if self.options.shared_routines:
+            self.used_routines.add(RETURN_ROUTINE)
+            self.write([f"@{RETURN_ROUTINE}", "0;JMP"])
+            return
+        self.write(self.returnAsm())
+
+    def returnAsm(self) -> list[str]:
         # use R13 for frame, R14 for retAddr
         # frame = LCL
-        self.write(["@LCL", "D=M", "@R13", "M=D"])
+        asm = ["@LCL", "D=M", "@R13", "M=D"]
         # retAddr = *(frame-5)
-        self.write(["@R13", "D=M", "@5", "D=D-A", "A=D", "D=M", "@R14", "M=D"])
+        asm += ["@R13", "D=M", "@5", "D=D-A", "A=D", "D=M", "@R14", "M=D"]
         # *ARG = pop()
-        self.write(POP_ASM + ["@ARG", "A=M", "M=D"])
+        asm += POP_ASM + ["@ARG", "A=M", "M=D"]
         # SP = ARG+1
-        self.write(["@ARG", "D=M+1", "@SP", "M=D"])
+        asm += ["@ARG", "D=M+1", "@SP", "M=D"]
         # restore that/this/arg/lcl
         for l in ["THAT", "THIS", "ARG", "LCL"]:
-            self.write(["@R13", "AM=M-1", "D=M", f"@{l}", "M=D"])
+            asm += ["@R13", "AM=M-1", "D=M", f"@{l}", "M=D"]
         # goto retAddr
-        self.write(["@R14", "A=M", "0;JMP"])
+        asm += ["@R14", "A=M", "0;JMP"]
+        return asm
+
+    def callRoutineAsm(self) -> list[str]:
+        asm = [f"({CALL_ROUTINE})"]
+        # push retAddr (D), LCL, ARG, THIS, THAT
+        asm += PUSH_ASM
+        for l in ["LCL", "ARG", "THIS", "THAT"]:
+            asm += [f"@{l}", "D=M"] + PUSH_ASM
+        # ARG = SP-(nArgs+5)
+        asm += ["@R13", "D=M", "@SP", "D=M-D", "@ARG", "M=D"]
+        # LCL = SP
+        asm += ["@SP", "D=M", "@LCL", "M=D"]
+        # goto f
+        asm += ["@R14", "A=M", "0;JMP"]
+        return asm
+
+    def returnRoutineAsm(self) -> list[str]:
+        return [f"({RETURN_ROUTINE})"] + self.returnAsm()
+
+    def compareRoutineAsm(self, jump: str) -> list[str]:
+        # D の戻り先を R15 に退避し、結果 (-1/0) を x の位置に書く
+        routine = COMPARE_ROUTINE[jump]
+        label_true = f"{routine}_TRUE"
+        return [
+            f"({routine})",
+            "@R15",
+            "M=D",
+            "@SP",
+            "AM=M-1",
+            "D=M",
+            "A=A-1",
+            "D=M-D",
+            "M=-1",
+            f"@{label_true}",
+            f"D;{jump}",
+            "@SP",
+            "A=M-1",
+            "M=0",
+            f"({label_true})",
+            "@R15",
+            "A=M",
+            "0;JMP",
+        ]
 
     def _returnAddrLabel(self, functionName: str) -> str:
         label = f"{functionName}$ret.{self.return_counter}"
         self.return_counter += 1
+        return self._generatedLabel(label)
+
+    def _generatedLabel(self, label: str) -> str:
+        if self.options.local_labels:
+            return f"{self.currentFile}:{label}"
         return label
 
     def write(self, asms: list[str]) -> None:
+        if self.file is None:
+            self.lines.extend(asms)
+            return
         for a in asms:
             self.file.write(a + "\n")
 
     def setFileName(self, fileName: str) -> None:
+        self.flushTos()
         self.currentFile, _ = os.path.splitext(fileName)
         self.currentFunction = None
+        if self.options.local_labels:
+            self.label_counter = 0
+            self.return_counter = 0
+
+    def writeRoutines(self) -> None:
+        # END の無限ループの後ろに置くので、直接実行されることはない
+        if CALL_ROUTINE in self.used_routines:
+            self.write(self.callRoutineAsm())
+        if RETURN_ROUTINE in self.used_routines:
+            self.write(self.returnRoutineAsm())
+        for jump, routine in COMPARE_ROUTINE.items():
+            if routine in self.used_routines:
+                self.write(self.compareRoutineAsm(jump))
+        if ZERO_FILL_ROUTINE in self.used_routines:
+            self.write(self.zeroFillRoutineAsm())
 
     def close(self):
-        if hasattr(self, "file") and not self.file.closed:
-            self.write(["(END)", "@END", "0;JMP"])
+        if self.closed:
+            return
+        self.closed = True
+        self.flushTos()
+        self.write(["(END)", "@END", "0;JMP"])
+        self.writeRoutines()
+        if self.file is not None:
             self.file.close()
 
     def __enter__(self):
@@ -0,0 +1,202 @@
+import argparse
+import importlib
+import os
+import sys
+import time
+from collections import Counter
+from types import ModuleType
+
+from codewriter import CodegenOptions, CodeWriter
+from vm_dead_code import DeadFunctionReport
+from vm_optimizer import format_hits
+from vmtranslator import collect_vm_files, translate_all
+
+# .vm から .hack / ROMイメージまでを1プロセスで行う。
+# ASMはテキストファイルを経由せず、行のリストのままアセンブラに渡す
+
+ASSEMBLER_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "06"
+)
+# 06 のアセンブラを構成するモジュール
+ASSEMBLER_MODULES = (
+    "parser",
+    "hack_code",
+    "optimizer",
+    "rom_image",
+    "symbol",
+    "assembler",
+)
+
+
+def load_isolated(
+    directory: str, module_names: tuple[str, ...], entry: str
+) -> dict[str, ModuleType]:
+    # 章ごとのディレクトリには同名のモジュール（parser, symbol）があるので、
+    # sys.modules を一時的に入れ替えて読み込む。読み込んだモジュールを名前で返す
+    saved = {
+        name: sys.modules.pop(name) for name in module_names if name in sys.modules
+    }
+    sys.path.insert(0, directory)
+    try:
+        importlib.import_module(entry)
+        return {name: sys.modules[name] for name in module_names if name in sys.modules}
+    finally:
+        sys.path.remove(directory)
+        for name in module_names:
+            sys.modules.pop(name, None)
+        sys.modules.update(saved)
+
+
+def load_assembler() -> ModuleType:
+    return load_isolated(ASSEMBLER_DIR, ASSEMBLER_MODULES, "assembler")["assembler"]
+
+
+def translate_to_lines(
+    vm_files: list[str],
+    options: CodegenOptions | None = None,
+    peephole_hits: Counter | None = None,
+    comments: bool = False,
+    dead_functions: DeadFunctionReport | None = None,
+    jobs: int | None = None,
+) -> list[str]:
+    code_writer = CodeWriter(None, os.path.basename(vm_files[0]), options)
+    with code_writer:
+        translate_all(
+            code_writer, vm_files, peephole_hits, comments, dead_functions, jobs
+        )
+    return code_writer.lines
+
+
+def build(
+    input_path: str,
+    output_format: str = "hack",
+    options: CodegenOptions | None = None,
+    peephole_hits: Counter | None = None,
+    optimize_asm: bool = False,
+    keep_asm: bool = False,
+    dead_functions: DeadFunctionReport | None = None,
+    jobs: int | None = None,
+) -> tuple[str, int]:
+    # 出力ファイル名と命令数を返す
+    assembler = load_assembler()
+    vm_files, asm_file = collect_vm_files(input_path)
+    lines = translate_to_lines(
+        vm_files, options, peephole_hits, keep_asm, dead_functions, jobs
+    )
+    if keep_asm:
+        # デバッグ用にASMも書き出す
+        with open(asm_file, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    assembly = assembler.assemble(lines, optimize_asm)
+    words = assembly.words()
+    if assembly.report is not None:
+        print(assembly.report)
+    output_file = assembler.output_filename(asm_file, output_format)
+    assembler.write_output(output_file, words, output_format)
+    return output_file, len(words)
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="VM to Hack builder")
+    arg_parser.add_argument("input_path", help="vm file or directory")
+    arg_parser.add_argument(
+        "--format",
+        choices=("hack", "rom"),
+        default="hack",
+        help="hack: テキスト形式 / rom: uint16 のバイナリROMイメージ",
+    )
+    arg_parser.add_argument(
+        "--asm",
+        action="store_true",
+        help="デバッグ用に中間の .asm も出力する",
+    )
+    arg_parser.add_argument(
+        "--shared-routines",
+        action="store_true",
+        help="call/return/比較を共有ルーチンにしてコードサイズを減らす",
+    )
+    arg_parser.add_argument(
+        "--cache-tos",
+        action="store_true",
+        help="スタックトップを D レジスタに置いたまま変換する",
+    )
+    arg_parser.add_argument(
+        "--specialize",
+        action="store_true",
+        help="インデックスや定数に応じて命令数の少ないpush/popを選ぶ",
+    )
+    arg_parser.add_argument(
+        "--compact-prologue",
+        action="store_true",
+        help="ローカル変数の初期化をまとめて行い、多い場合は共有ループを使う",
+    )
+    arg_parser.add_argument(
+        "--prologue-loop-locals",
+        type=int,
+        default=CodegenOptions.prologue_loop_locals,
+        metavar="N",
+        help="共有の0埋めループを使うローカル変数の数（既定: %(default)s）",
+    )
+    arg_parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="よく現れるVMコマンド列をまとめて変換する",
+    )
+    arg_parser.add_argument(
+        "--optimize-asm",
+        action="store_true",
+        help="アセンブル前にASMレベルの最適化を行う",
+    )
+    arg_parser.add_argument(
+        "--remove-unused",
+        action="store_true",
+        help="Sys.init から呼ばれない関数を出力しない",
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="ファイルごとに並列変換するworker数（0 で利用可能なコア数。"
+        "ラベルはファイル単位になる）",
+    )
+    args = arg_parser.parse_args()
+    if args.jobs is not None and args.jobs < 0:
+        arg_parser.error("--jobs には0以上を指定する")
+
+    options = CodegenOptions(
+        shared_routines=args.shared_routines,
+        cache_tos=args.cache_tos,
+        specialize=args.specialize,
+        compact_prologue=args.compact_prologue,
+        prologue_loop_locals=args.prologue_loop_locals,
+    )
+    peephole_hits = Counter() if args.optimize else None
+    dead_functions = DeadFunctionReport() if args.remove_unused else None
+    start = time.perf_counter()
+    try:
+        output_file, size = build(
+            args.input_path,
+            args.format,
+            options,
+            peephole_hits,
+            optimize_asm=args.optimize_asm,
+            keep_asm=args.asm,
+            dead_functions=dead_functions,
+            jobs=args.jobs,
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    print(f"Build completed: {output_file} ({size} words, {elapsed:.3f}s)")
+    if peephole_hits is not None:
+        print(format_hits(peephole_hits))
+    if dead_functions is not None:
+        print(dead_functions)
+
+
+if __name__ == "__main__":
+    main()
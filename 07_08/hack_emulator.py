@@ -0,0 +1,179 @@
+import argparse
+import os
+import re
+import sys
+
+from hack_build import ASSEMBLER_DIR, load_isolated
+
+# Hack CPU のエミュレータ。CPU エミュレータ用のテストスクリプト（.tst）のうち
+# set / repeat / ticktock / output-list / output だけを解釈し、結果を .cmp と比べる。
+# 変換オプションを変えた出力も同じテストで確かめるための回帰テスト用
+
+RAM_SIZE = 32768
+WORD_MASK = 0xFFFF
+
+# .tst の命令。repeat の中身は ticktock だけとみなす。
+# load / output-file / compare-to は結果に関係しないので読み飛ばす
+TST_PATTERN = re.compile(
+    r"(?P<skip>\b(?:load|output-file|compare-to)\b[^,;]*)"
+    r"|(?P<repeat>repeat\s+(?P<count>\d+)\s*\{(?P<body>[^}]*)\})"
+    r"|(?P<set>set\s+RAM\[(?P<address>\d+)\]\s+(?P<value>-?\d+))"
+    r"|(?P<ticktock>ticktock)"
+    r"|(?P<output_list>output-list(?P<columns>[^;]*))"
+    r"|(?P<output>\boutput(?![-\w]))"
+)
+RAM_COLUMN = re.compile(r"RAM\[(\d+)\]")
+
+
+def load_hack(hack_file: str) -> list[int]:
+    with open(hack_file, "r") as f:
+        return [int(line, 2) for line in f if line.strip()]
+
+
+def load_rom(rom_file: str) -> list[int]:
+    # 06 のアセンブラが書き出すROMイメージ（--format rom）
+    rom_image = load_isolated(ASSEMBLER_DIR, ("rom_image",), "rom_image")["rom_image"]
+    with rom_image.RomImage(rom_file) as image:
+        return list(image.words)
+
+
+def load_program(program_file: str) -> list[int]:
+    if program_file.endswith(".rom"):
+        return load_rom(program_file)
+    return load_hack(program_file)
+
+
+def to_signed(value: int) -> int:
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class HackCPU:
+    def __init__(self, rom: list[int]) -> None:
+        self.rom = rom
+        self.ram = [0] * RAM_SIZE
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.ticks = 0
+        self.halted = False
+
+    def run(self, ticks: int) -> None:
+        # 自分自身へ無条件に戻るループ（@n; 0;JMP）に入ったら停止したとみなす
+        rom, ram = self.rom, self.ram
+        a, d, pc = self.a, self.d, self.pc
+        size = len(rom)
+        executed = 0
+        while executed < ticks and not self.halted:
+            if pc >= size:
+                self.halted = True
+                break
+            instruction = rom[pc]
+            executed += 1
+            if not instruction & 0x8000:
+                a = instruction
+                pc += 1
+                continue
+
+            comp = (instruction >> 6) & 0x3F
+            x = d
+            y = ram[a & 0x7FFF] if instruction & 0x1000 else a
+            if comp & 0x20:
+                x = 0
+            if comp & 0x10:
+                x = ~x & WORD_MASK
+            if comp & 0x08:
+                y = 0
+            if comp & 0x04:
+                y = ~y & WORD_MASK
+            out = (x + y) & WORD_MASK if comp & 0x02 else x & y
+            if comp & 0x01:
+                out = ~out & WORD_MASK
+
+            address = a & 0x7FFF
+            if instruction & 0x08:
+                ram[address] = out
+            if instruction & 0x20:
+                a = out
+            if instruction & 0x10:
+                d = out
+
+            jump = instruction & 0x07
+            signed = to_signed(out)
+            if (
+                (jump & 0x04 and signed < 0)
+                or (jump & 0x02 and signed == 0)
+                or (jump & 0x01 and signed > 0)
+            ):
+                if jump == 0x07 and address == pc - 1 and rom[pc - 1] == pc - 1:
+                    self.halted = True
+                pc = address
+            else:
+                pc += 1
+        self.a, self.d, self.pc = a, d, pc
+        self.ticks += executed
+
+
+def run_script(rom: list[int], tst_source: str) -> tuple[list[list[int]], int]:
+    # 出力した行（符号付きの値）と実行したクロック数を返す
+    cpu = HackCPU(rom)
+    columns: list[int] = []
+    rows: list[list[int]] = []
+    source = re.sub(r"//[^\n]*|/\*[\s\S]*?\*/", "", tst_source)
+    for m in TST_PATTERN.finditer(source):
+        if m.group("skip"):
+            continue
+        if m.group("repeat"):
+            cpu.run(int(m.group("count")) * m.group("body").count("ticktock"))
+        elif m.group("set"):
+            cpu.ram[int(m.group("address"))] = int(m.group("value")) & WORD_MASK
+        elif m.group("ticktock"):
+            cpu.run(1)
+        elif m.group("output_list"):
+            columns = [int(a) for a in RAM_COLUMN.findall(m.group("columns"))]
+        else:
+            rows.append([to_signed(cpu.ram[address]) for address in columns])
+    return rows, cpu.ticks
+
+
+def read_cmp(cmp_file: str) -> list[list[int]]:
+    # 見出しの行を除き、値の行だけを返す
+    rows = []
+    with open(cmp_file, "r") as f:
+        for line in f:
+            cells = [cell.strip() for cell in line.strip().strip("|").split("|")]
+            if cells and all(re.fullmatch(r"-?\d+", cell) for cell in cells):
+                rows.append([int(cell) for cell in cells])
+    return rows
+
+
+def check(program_file: str) -> tuple[bool, str]:
+    # 同じディレクトリの同名の .tst / .cmp で確かめる
+    base = os.path.splitext(program_file)[0]
+    with open(base + ".tst", "r") as f:
+        rows, ticks = run_script(load_program(program_file), f.read())
+    expected = read_cmp(base + ".cmp")
+    if rows != expected:
+        return False, f"Mismatch: {program_file}: expected {expected}, got {rows}"
+    return True, f"Passed: {program_file} ({ticks} ticks)"
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Hack CPU emulator")
+    arg_parser.add_argument(
+        "program_files",
+        nargs="+",
+        help="同名の .tst / .cmp と並べて置いた .hack または .rom",
+    )
+    args = arg_parser.parse_args()
+
+    failed = False
+    for program_file in args.program_files:
+        ok, message = check(program_file)
+        print(message)
+        failed |= not ok
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import Iterable, Iterator, NamedTuple
 
 
 class CommandType(Enum):
@@ -13,6 +14,21 @@ class CommandType(Enum):
     C_CALL = 9
 
 
+class ArithmeticOp(Enum):
+    ADD = "add"
+    SUB = "sub"
+    NEG = "neg"
+    EQ = "eq"
+    GT = "gt"
+    LT = "lt"
+    AND = "and"
+    OR = "or"
+    NOT = "not"
+
+
+# 算術コマンドの文字列から opcode を引く
+ARITHMETIC_OPS = {op.value: op for op in ArithmeticOp}
+
 COMMAND_TYPE_MAP = {
     "add": CommandType.C_ARITHMETIC,
     "sub": CommandType.C_ARITHMETIC,
@@ -34,71 +50,112 @@ COMMAND_TYPE_MAP = {
 }
 
 
+class Command(NamedTuple):
+    type: CommandType
+    # 算術コマンドでは ArithmeticOp、それ以外では文字列
+    arg1: str | ArithmeticOp | None
+    arg2: int | None
+    # コメント出力用の元の行
+    text: str
+
+
+# arg2 を持つコマンド
+COMMANDS_WITH_ARG2 = frozenset(
+    (
+        CommandType.C_PUSH,
+        CommandType.C_POP,
+        CommandType.C_FUNCTION,
+        CommandType.C_CALL,
+    )
+)
+
+
+def parse_line(line: str) -> Command | None:
+    # コメントと前後の空白を除去し、空行なら None を返す
+    cleaned = line.split("//", 1)[0].strip()
+    if not cleaned:
+        return None
+
+    parts = cleaned.split()
+    command_type = COMMAND_TYPE_MAP.get(parts[0])
+    if command_type is None:
+        raise Exception(f"called for unsupported command: {parts[0]}")
+
+    if command_type == CommandType.C_ARITHMETIC:
+        return Command(command_type, ARITHMETIC_OPS[parts[0]], None, cleaned)
+    if command_type == CommandType.C_RETURN:
+        return Command(command_type, None, None, cleaned)
+    if command_type in COMMANDS_WITH_ARG2:
+        return Command(command_type, parts[1], int(parts[2]), cleaned)
+    return Command(command_type, parts[1], None, cleaned)
+
+
+def iter_commands(lines: Iterable[str]) -> Iterator[Command]:
+    # 1行ずつ解析するので、入力はストリームのまま処理できる
+    for line in lines:
+        command = parse_line(line)
+        if command is not None:
+            yield command
+
+
+def parse_lines(lines: Iterable[str]) -> list[Command]:
+    return list(iter_commands(lines))
+
+
+def read_commands(filepath: str) -> list[Command]:
+    # ファイルは一度にまとめて読み込む
+    with open(filepath, "r") as f:
+        source = f.read()
+    return parse_lines(source.splitlines())
+
+
 # VMコマンドの構文解析を行う（文法チェックは行わない）
+# NOTE: ファイルは __enter__ でまとめて解析し、以降はリストを順にたどる
 class Parser:
     def __init__(self, filepath: str) -> None:
         self.filepath: str = filepath
-        self.file = None
+        self.commands: list[Command] = []
+        self.position = 0
+        self.current: Command | None = None
         self.current_line: str | None = None
 
     def hasMoreLines(self) -> bool:
-        pos = self.file.tell()
-        # 1行読んでみる
-        line = self.file.readline()
-        # ファイルポインタを元の位置に戻す
-        self.file.seek(pos)
-        # 空文字列（EOF）でなければTrue
-        return bool(line)
+        return self.position < len(self.commands)
 
     def advance(self) -> None:
-        while True:
-            if not self.hasMoreLines():
-                # EOF
-                self.current_line = None
-                return None
-
-            line = self.file.readline()
-            # コメントと前後の空白を除去
-            cleaned = line.split("//", 1)[0].strip()
-            if not cleaned:
-                # 空行またはコメントのみの行はスキップ
-                continue
-
-            self.current_line = cleaned
+        if not self.hasMoreLines():
+            # EOF
+            self.current = None
+            self.current_line = None
             return None
 
-    def commandType(self) -> CommandType:
-        command = self.current_line.split()[0]
+        self.current = self.commands[self.position]
+        self.current_line = self.current.text
+        self.position += 1
+        return None
 
-        if command in COMMAND_TYPE_MAP:
-            return COMMAND_TYPE_MAP[command]
-        else:
-            raise Exception(f"called for unsupported command: {command}")
+    def commandType(self) -> CommandType:
+        return self.current.type
 
-    def arg1(self) -> str:
-        command_type = self.commandType()
-        if command_type == CommandType.C_ARITHMETIC:
-            return self.current_line.split()[0]
-        if command_type != CommandType.C_RETURN:
-            return self.current_line.split()[1]
-        raise Exception("called for invalid command type")
+    def arg1(self) -> str | ArithmeticOp:
+        if self.current.type == CommandType.C_RETURN:
+            raise Exception("called for invalid command type")
+        return self.current.arg1
 
     def arg2(self) -> int:
-        if self.commandType() in [
-            CommandType.C_PUSH,
-            CommandType.C_POP,
-            CommandType.C_FUNCTION,
-            CommandType.C_CALL,
-        ]:
-            return int(self.current_line.split()[2])
-        raise Exception("called for invalid command type")
+        if self.current.type not in COMMANDS_WITH_ARG2:
+            raise Exception("called for invalid command type")
+        return self.current.arg2
+
+    def command(self) -> Command:
+        return self.current
 
     def close(self) -> None:
-        if hasattr(self, "file") and not self.file.closed:
-            self.file.close()
+        self.commands = []
 
     def __enter__(self):
-        self.file = open(self.filepath, "r")
+        self.commands = read_commands(self.filepath)
+        self.position = 0
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -4,6 +4,12 @@ set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 VM_TRANSLATOR="$SCRIPT_DIR/vmtranslator.py"
+ASSEMBLER="$SCRIPT_DIR/../06/assembler.py"
+BATCH_ASSEMBLER="$SCRIPT_DIR/../06/batch_assembler.py"
+EMULATOR="$SCRIPT_DIR/hack_emulator.py"
+HACK_BUILD="$SCRIPT_DIR/hack_build.py"
+BUILD_SERVER="$SCRIPT_DIR/build_server.py"
+BUILD_CLIENT="$SCRIPT_DIR/build_client.py"
 SAMPLE_SRC="$SCRIPT_DIR/sample"
 
 if [[ ! -d "$SAMPLE_SRC" ]]; then
@@ -12,7 +18,12 @@ if [[ ! -d "$SAMPLE_SRC" ]]; then
 fi
 
 TMP_ROOT="$(mktemp -d)"
-trap 'rm -rf "$TMP_ROOT"' EXIT
+SERVER_PID=""
+cleanup() {
+  [[ -n "$SERVER_PID" ]] && kill "$SERVER_PID" 2>/dev/null
+  rm -rf "$TMP_ROOT"
+}
+trap cleanup EXIT
 
 WORK_SAMPLE="$TMP_ROOT/sample"
 cp -R "$SAMPLE_SRC" "$WORK_SAMPLE"
@@ -33,4 +44,176 @@ for target in "$WORK_SAMPLE"/*; do
   diff -u "$expected" "$generated"
 done
 
+# 変換オプションごとに全サンプルを変換し、エミュレータで実行した結果を .cmp と比べる
+MODES=(
+  "--shared-routines"
+  "--optimize"
+  "--optimize --shared-routines"
+  "--remove-unused"
+  "-j 2"
+  "-j 2 --remove-unused"
+  "--cache-tos"
+  "--cache-tos --optimize --shared-routines"
+  "--cache-tos -j 2"
+  "--specialize"
+  "--specialize --cache-tos --optimize"
+  "--compact-prologue"
+  "--compact-prologue --prologue-loop-locals 1 --cache-tos"
+)
+
+# .hack をそれぞれ同名の .tst で実行する。失敗したら結果を表示して終了する
+check_hack() {
+  local label="$1"
+  shift
+  if ! python "$EMULATOR" "$@" >"$TMP_ROOT/emulator.log"; then
+    echo "Mismatch ($label):" >&2
+    grep -v "^Passed" "$TMP_ROOT/emulator.log" >&2
+    exit 1
+  fi
+}
+
+for mode in "${MODES[@]}"; do
+  MODE_SAMPLE="$TMP_ROOT/mode"
+  rm -rf "$MODE_SAMPLE"
+  cp -R "$SAMPLE_SRC" "$MODE_SAMPLE"
+  for target in "$MODE_SAMPLE"/*; do
+    [[ -d "$target" ]] || continue
+    # shellcheck disable=SC2086
+    python "$VM_TRANSLATOR" $mode "$target" >/dev/null
+  done
+  # アセンブルと実行は全サンプルをまとめて1プロセスずつで行う
+  python "$BATCH_ASSEMBLER" "$MODE_SAMPLE"/*/*.asm >/dev/null
+  check_hack "$mode" "$MODE_SAMPLE"/*/*.hack
+  echo "Passed: $mode"
+done
+
+# 並列変換の出力は worker 数（0 は利用可能なコア数）によらず同じ
+for target in "$SAMPLE_SRC"/*; do
+  [[ -d "$target" ]] || continue
+  base_name="$(basename "$target")"
+  for jobs in 0 1 3; do
+    mkdir -p "$TMP_ROOT/jobs$jobs"
+    cp -R "$target" "$TMP_ROOT/jobs$jobs/$base_name"
+    python "$VM_TRANSLATOR" -j "$jobs" "$TMP_ROOT/jobs$jobs/$base_name" >/dev/null
+  done
+  for jobs in 0 3; do
+    diff -u "$TMP_ROOT/jobs1/$base_name/$base_name.asm" \
+      "$TMP_ROOT/jobs$jobs/$base_name/$base_name.asm"
+  done
+done
+echo "Passed: -j output does not depend on the worker count"
+
+# --remove-unused では Sys.init から呼ばれない関数が出力に残らない
+DEAD_SAMPLE="$TMP_ROOT/dead/DeadFunction"
+mkdir -p "$TMP_ROOT/dead"
+cp -R "$SAMPLE_SRC/DeadFunction" "$DEAD_SAMPLE"
+python "$VM_TRANSLATOR" --remove-unused "$DEAD_SAMPLE" >/dev/null
+if grep -q "(Main.unused)" "$DEAD_SAMPLE/DeadFunction.asm"; then
+  echo "Unused function was not removed: Main.unused" >&2
+  exit 1
+fi
+python "$ASSEMBLER" "$DEAD_SAMPLE/DeadFunction.asm" >/dev/null
+check_hack "--remove-unused" "$DEAD_SAMPLE/DeadFunction.hack"
+
+# 標準入力から読む場合（.vm が1つのサンプルのみ）。既定の出力はファイルから
+# 変換したものと同じで、オプション付きの出力はエミュレータで実行して確かめる
+STREAM_SAMPLE="$TMP_ROOT/stream"
+cp -R "$SAMPLE_SRC" "$STREAM_SAMPLE"
+stream_hack=()
+for target in "$STREAM_SAMPLE"/*; do
+  vm_files=("$target"/*.vm)
+  [[ ${#vm_files[@]} -eq 1 ]] || continue
+  base_name="$(basename "$target")"
+  file_name="$(basename "${vm_files[0]}")"
+  bootstrap=""
+  [[ "$file_name" == "Sys.vm" ]] && bootstrap="--bootstrap"
+  # shellcheck disable=SC2086
+  python "$VM_TRANSLATOR" - $bootstrap --file-name "$file_name" \
+    <"${vm_files[0]}" >"$target/$base_name.asm"
+  diff -u "$SAMPLE_SRC/$base_name/$base_name.asm" "$target/$base_name.asm"
+  # shellcheck disable=SC2086
+  python "$VM_TRANSLATOR" - $bootstrap --cache-tos --optimize --file-name "$file_name" \
+    <"${vm_files[0]}" >"$target/$base_name.asm" 2>/dev/null
+  python "$ASSEMBLER" "$target/$base_name.asm" >/dev/null
+  stream_hack+=("$target/$base_name.hack")
+done
+check_hack "stdin" "${stream_hack[@]}"
+echo "Passed: stdin"
+
+# hack_build は .asm を書かずに .hack / .rom まで作るので、それを直接実行する。
+# ASMレベルの最適化（--optimize-asm）と ROM イメージ形式もここで確かめる
+BUILD_MODES=(
+  "--shared-routines"
+  "--optimize-asm"
+  "--optimize-asm --optimize --cache-tos --shared-routines"
+  "--optimize-asm --specialize --compact-prologue --remove-unused"
+  "--format rom"
+  "--format rom --optimize-asm --cache-tos"
+)
+for mode in "${BUILD_MODES[@]}"; do
+  BUILD_SAMPLE="$TMP_ROOT/build"
+  rm -rf "$BUILD_SAMPLE"
+  cp -R "$SAMPLE_SRC" "$BUILD_SAMPLE"
+  for target in "$BUILD_SAMPLE"/*; do
+    [[ -d "$target" ]] || continue
+    # shellcheck disable=SC2086
+    python "$HACK_BUILD" $mode "$target" >/dev/null
+  done
+  extension="hack"
+  [[ "$mode" == *"--format rom"* ]] && extension="rom"
+  check_hack "hack_build $mode" "$BUILD_SAMPLE"/*/*."$extension"
+  echo "Passed: hack_build $mode"
+done
+
+# ビルドサーバーの build を .vm のサンプルと、OS と一緒の .jack のサンプルで実行する
+SERVER_SAMPLE="$TMP_ROOT/server"
+SOCKET="$TMP_ROOT/build.sock"
+cp -R "$SAMPLE_SRC" "$SERVER_SAMPLE"
+JACK_SAMPLE="$SERVER_SAMPLE/MultiplyByConstant"
+cp -R "$SCRIPT_DIR/../10_11/sample/MultiplyByConstant" "$JACK_SAMPLE"
+rm "$JACK_SAMPLE"/*.vm
+for os_class in "$SCRIPT_DIR"/../12/*.jack; do
+  [[ -f "$JACK_SAMPLE/$(basename "$os_class")" ]] || cp "$os_class" "$JACK_SAMPLE/"
+done
+python "$BUILD_SERVER" --socket "$SOCKET" >"$TMP_ROOT/server.log" &
+SERVER_PID=$!
+for _ in $(seq 100); do
+  [[ -S "$SOCKET" ]] && break
+  sleep 0.1
+done
+# クライアントはエラーも標準出力に出すので、失敗したら表示して終了する
+build_on_server() {
+  if ! python "$BUILD_CLIENT" --socket "$SOCKET" build "$@" >"$TMP_ROOT/client.log"; then
+    echo "Build server failed: $*" >&2
+    cat "$TMP_ROOT/client.log" >&2
+    exit 1
+  fi
+}
+for target in "$SERVER_SAMPLE"/*; do
+  [[ -d "$target" ]] || continue
+  build_on_server "$target"
+done
+check_hack "build_server" "$SERVER_SAMPLE"/*/*.hack
+build_on_server --remove-unused "$SERVER_SAMPLE/DeadFunction"
+build_on_server --fold-constants "$JACK_SAMPLE"
+check_hack "build_server --fold-constants" "$JACK_SAMPLE/MultiplyByConstant.hack"
+check_hack "build_server --remove-unused" "$SERVER_SAMPLE/DeadFunction/DeadFunction.hack"
+# サーバーでの変換は同じオプションの vmtranslator と同じ出力になる
+for mode in "--compact-prologue" "--compact-prologue --prologue-loop-locals 1 --cache-tos"; do
+  for side in server cli; do
+    rm -rf "$TMP_ROOT/$side"
+    cp -R "$SAMPLE_SRC/NestedCall" "$TMP_ROOT/$side"
+  done
+  # shellcheck disable=SC2086
+  python "$BUILD_CLIENT" --socket "$SOCKET" translate $mode "$TMP_ROOT/server" >/dev/null
+  # shellcheck disable=SC2086
+  python "$VM_TRANSLATOR" $mode "$TMP_ROOT/cli" >/dev/null
+  diff -u "$TMP_ROOT/cli/cli.asm" "$TMP_ROOT/server/server.asm"
+done
+
+python "$BUILD_CLIENT" --socket "$SOCKET" shutdown >/dev/null
+wait "$SERVER_PID"
+SERVER_PID=""
+echo "Passed: build_server"
+
 echo "VM translator regression tests passed"
@@ -0,0 +1,13 @@
+// Tests DeadFunction.asm on the CPU emulator.
+
+load DeadFunction.asm,
+output-file DeadFunction.out,
+compare-to DeadFunction.cmp,
+
+repeat 500 {
+  ticktock;
+}
+
+// Outputs the stack pointer and Sys.0, where Sys.init stores the result.
+output-list RAM[0]%D1.6.1 RAM[16]%D1.6.1;
+output;
@@ -0,0 +1,233 @@
+// push constant 5
+@5
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+// not
+@SP
+A=M-1
+M=!M
+// if-goto JUMP_5
+@SP
+AM=M-1
+D=M
+@NotIfGoto$JUMP_5
+D;JNE
+// push constant 1
+@1
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+// pop temp 0
+@SP
+AM=M-1
+D=M
+@5
+M=D
+// goto DONE_5
+@NotIfGoto$DONE_5
+0;JMP
+// label JUMP_5
+(NotIfGoto$JUMP_5)
+// push constant 2
+@2
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+// pop temp 0
+@SP
+AM=M-1
+D=M
+@5
+M=D
+// label DONE_5
+(NotIfGoto$DONE_5)
+// push constant 0
+@0
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+// not
+@SP
+A=M-1
+M=!M
+// if-goto JUMP_0
+@SP
+AM=M-1
+D=M
+@NotIfGoto$JUMP_0
+D;JNE
+// push constant 1
+@1
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+// pop temp 1
+@SP
+AM=M-1
+D=M
+@6
+M=D
+// goto DONE_0
+@NotIfGoto$DONE_0
+0;JMP
+// label JUMP_0
+(NotIfGoto$JUMP_0)
+// push constant 2
+@2
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+// pop temp 1
+@SP
+AM=M-1
+D=M
+@6
+M=D
+// label DONE_0
+(NotIfGoto$DONE_0)
+// push constant 1
+@1
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+// neg
+@SP
+A=M-1
+M=-M
+// not
+@SP
+A=M-1
+M=!M
+// if-goto JUMP_TRUE
+@SP
+AM=M-1
+D=M
+@NotIfGoto$JUMP_TRUE
+D;JNE
+// push constant 1
+@1
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+// pop temp 2
+@SP
+AM=M-1
+D=M
+@7
+M=D
+// goto DONE_TRUE
+@NotIfGoto$DONE_TRUE
+0;JMP
+// label JUMP_TRUE
+(NotIfGoto$JUMP_TRUE)
+// push constant 2
+@2
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+// pop temp 2
+@SP
+AM=M-1
+D=M
+@7
+M=D
+// label DONE_TRUE
+(NotIfGoto$DONE_TRUE)
+// push constant 3
+@3
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+// pop temp 3
+@SP
+AM=M-1
+D=M
+@8
+M=D
+// label LOOP
+(NotIfGoto$LOOP)
+// push temp 3
+@8
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+// not
+@SP
+A=M-1
+M=!M
+// if-goto LOOP_END
+@SP
+AM=M-1
+D=M
+@NotIfGoto$LOOP_END
+D;JNE
+// push temp 3
+@8
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+// push constant 1
+@1
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+// sub
+@SP
+AM=M-1
+D=M
+A=A-1
+M=M-D
+// pop temp 3
+@SP
+AM=M-1
+D=M
+@8
+M=D
+// goto LOOP
+@NotIfGoto$LOOP
+0;JMP
+// label LOOP_END
+(NotIfGoto$LOOP_END)
+(END)
+@END
+0;JMP
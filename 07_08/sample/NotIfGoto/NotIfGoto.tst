@@ -0,0 +1,15 @@
+// Tests NotIfGoto.asm on the CPU emulator.
+
+load NotIfGoto.asm,
+output-file NotIfGoto.out,
+compare-to NotIfGoto.cmp,
+
+set RAM[0] 256,  // initializes the stack pointer
+
+repeat 400 {     // enough cycles to complete the execution
+  ticktock;
+}
+
+// Outputs the stack pointer and the branch results: RAM[5]-RAM[8]
+output-list RAM[0]%D2.6.2 RAM[5]%D2.6.2 RAM[6]%D2.6.2 RAM[7]%D2.6.2 RAM[8]%D2.6.2;
+output;
@@ -0,0 +1,86 @@
+from dataclasses import dataclass, field
+
+from parser import Command, CommandType
+
+# 呼び出しグラフの起点（ブートストラップが呼ぶ関数）
+ENTRY_FUNCTION = "Sys.init"
+
+
+@dataclass
+class DeadFunctionReport:
+    # 削除した関数名 -> その関数のコマンド列
+    removed: dict[str, list[Command]] = field(default_factory=dict)
+    words_saved: int = 0
+
+    def __str__(self) -> str:
+        lines = [
+            f"Removed {len(self.removed)} unused functions"
+            f" ({self.words_saved} words)"
+        ]
+        for name in self.removed:
+            lines.append(f"  {name}")
+        return "\n".join(lines)
+
+
+def split_functions(
+    commands: list[Command],
+) -> list[tuple[str | None, list[Command]]]:
+    # function コマンドごとに区切る。最初の function より前の部分の名前は None
+    chunks: list[tuple[str | None, list[Command]]] = []
+    name: str | None = None
+    body: list[Command] = []
+    for command in commands:
+        if command.type == CommandType.C_FUNCTION:
+            if body:
+                chunks.append((name, body))
+            name, body = command.arg1, []
+        body.append(command)
+    if body:
+        chunks.append((name, body))
+    return chunks
+
+
+def build_call_graph(programs: dict[str, list[Command]]) -> dict[str, set[str]]:
+    graph: dict[str, set[str]] = {}
+    for commands in programs.values():
+        for name, body in split_functions(commands):
+            if name is None:
+                continue
+            graph[name] = {c.arg1 for c in body if c.type == CommandType.C_CALL}
+    return graph
+
+
+def reachable_functions(
+    graph: dict[str, set[str]], entry: str = ENTRY_FUNCTION
+) -> set[str]:
+    reached: set[str] = set()
+    stack = [entry]
+    while stack:
+        name = stack.pop()
+        if name in reached or name not in graph:
+            continue
+        reached.add(name)
+        stack.extend(graph[name] - reached)
+    return reached
+
+
+def remove_dead_functions(
+    programs: dict[str, list[Command]], report: DeadFunctionReport
+) -> dict[str, list[Command]]:
+    # programs: ファイルパス -> コマンド列。Sys.init から呼ばれない関数を除く
+    graph = build_call_graph(programs)
+    if ENTRY_FUNCTION not in graph:
+        # 起点がなければ何が呼ばれるか分からないので何も消さない
+        return programs
+
+    live = reachable_functions(graph)
+    result: dict[str, list[Command]] = {}
+    for path, commands in programs.items():
+        kept: list[Command] = []
+        for name, body in split_functions(commands):
+            if name is None or name in live:
+                kept.extend(body)
+            else:
+                report.removed[name] = body
+        result[path] = kept
+    return result
@@ -0,0 +1,103 @@
+from collections import Counter, deque
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+from parser import ArithmeticOp, Command, CommandType
+
+COMPARE = (ArithmeticOp.EQ, ArithmeticOp.GT, ArithmeticOp.LT)
+BINARY = (ArithmeticOp.ADD, ArithmeticOp.SUB, ArithmeticOp.AND, ArithmeticOp.OR)
+
+
+class FusedCommand(NamedTuple):
+    # 複数のVMコマンドをまとめて一つのASM列として出力する
+    pattern: str
+    commands: tuple[Command, ...]
+
+
+def _is_arithmetic(command: Command, ops: tuple[ArithmeticOp, ...]) -> bool:
+    return command.type == CommandType.C_ARITHMETIC and command.arg1 in ops
+
+
+def _match_push_pop_same(window: tuple[Command, ...]) -> bool:
+    push, pop = window
+    return (
+        push.type == CommandType.C_PUSH
+        and pop.type == CommandType.C_POP
+        and (push.arg1, push.arg2) == (pop.arg1, pop.arg2)
+    )
+
+
+def _match_push_pop(window: tuple[Command, ...]) -> bool:
+    push, pop = window
+    return push.type == CommandType.C_PUSH and pop.type == CommandType.C_POP
+
+
+def _match_push_binary(window: tuple[Command, ...]) -> bool:
+    push, op = window
+    return push.type == CommandType.C_PUSH and _is_arithmetic(op, BINARY)
+
+
+def _match_compare_not_if(window: tuple[Command, ...]) -> bool:
+    compare, negate, jump = window
+    return (
+        _is_arithmetic(compare, COMPARE)
+        and _is_arithmetic(negate, (ArithmeticOp.NOT,))
+        and jump.type == CommandType.C_IF
+    )
+
+
+def _match_compare_if(window: tuple[Command, ...]) -> bool:
+    compare, jump = window
+    return _is_arithmetic(compare, COMPARE) and jump.type == CommandType.C_IF
+
+
+def _match_not_if(window: tuple[Command, ...]) -> bool:
+    negate, jump = window
+    return _is_arithmetic(negate, (ArithmeticOp.NOT,)) and jump.type == CommandType.C_IF
+
+
+# (パターン名, ウィンドウ長, 判定) 長いウィンドウから順に試す
+PATTERNS: list[tuple[str, int, Callable[[tuple[Command, ...]], bool]]] = [
+    ("compare-not-if", 3, _match_compare_not_if),
+    ("push-pop-same", 2, _match_push_pop_same),
+    ("push-pop", 2, _match_push_pop),
+    ("push-binary", 2, _match_push_binary),
+    ("compare-if", 2, _match_compare_if),
+    ("not-if", 2, _match_not_if),
+]
+MAX_WINDOW = max(size for _, size, _ in PATTERNS)
+
+
+def optimize(
+    commands: Iterable[Command], hits: Counter
+) -> Iterator[Command | FusedCommand]:
+    # 先読みは MAX_WINDOW 個までなので、入力はストリームのまま処理できる
+    source = iter(commands)
+    window: deque[Command] = deque()
+    while True:
+        while len(window) < MAX_WINDOW:
+            command = next(source, None)
+            if command is None:
+                break
+            window.append(command)
+        if not window:
+            return
+
+        for name, size, match in PATTERNS:
+            if len(window) < size:
+                continue
+            candidate = tuple(window)[:size]
+            if match(candidate):
+                for _ in range(size):
+                    window.popleft()
+                hits[name] += 1
+                yield FusedCommand(name, candidate)
+                break
+        else:
+            yield window.popleft()
+
+
+def format_hits(hits: Counter) -> str:
+    lines = ["VM peephole optimizer:"]
+    for name, _, _ in PATTERNS:
+        lines.append(f"  {name}: {hits[name]}")
+    return "\n".join(lines)
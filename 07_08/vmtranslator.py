@@ -1,8 +1,27 @@
+import argparse
 import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from itertools import repeat
 import sys
+from typing import Callable, Iterable, Iterator
 
-from parser import Parser, CommandType
-from codewriter import CodeWriter
+from parser import Command, iter_commands, read_commands
+from codewriter import CodegenOptions, CodeWriter
+from vm_dead_code import DeadFunctionReport, remove_dead_functions
+from vm_optimizer import FusedCommand, format_hits, optimize
+
+
+# 標準入力から読むときの入力名と、static 変数名に使うファイル名
+STDIN_PATH = "-"
+STREAM_FILE_NAME = "Stdin.vm"
+
+
+def available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
 
 
 def collect_vm_files(input_path: str) -> tuple[list[str], str]:
@@ -30,52 +49,275 @@ def collect_vm_files(input_path: str) -> tuple[list[str], str]:
     raise Exception("Please specify a vm file or directory")
 
 
-def translate_file(code_writer: CodeWriter, vm_path: str) -> None:
+def translate_commands(
+    code_writer: CodeWriter,
+    commands: Iterable[Command],
+    peephole_hits: Counter | None = None,
+    comments: bool = True,
+) -> None:
+    # peephole_hits を渡すと最適化を行い、パターンごとの適用回数を数える
+    if peephole_hits is not None:
+        commands = optimize(commands, peephole_hits)
+
+    for command in commands:
+        translate_command(code_writer, command, comments)
+
+
+def translate_command(
+    code_writer: CodeWriter, command: Command | FusedCommand, comments: bool = True
+) -> None:
+    if isinstance(command, FusedCommand):
+        if comments:
+            texts = " / ".join(c.text for c in command.commands)
+            code_writer.write([f"// {texts}"])
+        code_writer.writeFused(command)
+    else:
+        if comments:
+            code_writer.write([f"// {command.text}"])
+        code_writer.writeCommand(command)
+
+
+def translate_stream(
+    lines: Iterable[str],
+    file_name: str = STREAM_FILE_NAME,
+    options: CodegenOptions | None = None,
+    peephole_hits: Counter | None = None,
+    comments: bool = True,
+    bootstrap: bool = False,
+) -> Iterator[str]:
+    # VMの行を順に読み、ASMの行をコマンドごとに返す。
+    # バッファは毎回空にするので、入力の長さによらずメモリ使用量は一定
+    code_writer = CodeWriter(None, file_name, options)
+    if bootstrap:
+        code_writer.writeBootstrap()
+        code_writer.setFileName(file_name)
+    commands: Iterable[Command | FusedCommand] = iter_commands(lines)
+    if peephole_hits is not None:
+        commands = optimize(commands, peephole_hits)
+
+    for command in commands:
+        translate_command(code_writer, command, comments)
+        yield from code_writer.lines
+        code_writer.lines.clear()
+    code_writer.close()
+    yield from code_writer.lines
+    code_writer.lines.clear()
+
+
+def translate_file(
+    code_writer: CodeWriter,
+    vm_path: str,
+    peephole_hits: Counter | None = None,
+    comments: bool = True,
+) -> None:
     code_writer.setFileName(os.path.basename(vm_path))
-    with Parser(vm_path) as parser:
-        while parser.hasMoreLines():
-            parser.advance()
-            if parser.current_line is None:
-                break
-
-            command_type = parser.commandType()
-            code_writer.write([f"// {parser.current_line}"])
-
-            if command_type == CommandType.C_ARITHMETIC:
-                code_writer.writeArithmetic(parser.arg1())
-            elif command_type in (CommandType.C_PUSH, CommandType.C_POP):
-                segment = parser.arg1()
-                index = parser.arg2()
-                code_writer.writePushPop(command_type, segment, index)
-            elif command_type == CommandType.C_LABEL:
-                code_writer.writeLabel(parser.arg1())
-            elif command_type == CommandType.C_GOTO:
-                code_writer.writeGoto(parser.arg1())
-            elif command_type == CommandType.C_IF:
-                code_writer.writeIf(parser.arg1())
-            elif command_type == CommandType.C_FUNCTION:
-                code_writer.writeFunction(parser.arg1(), parser.arg2())
-            elif command_type == CommandType.C_CALL:
-                code_writer.writeCall(parser.arg1(), parser.arg2())
-            elif command_type == CommandType.C_RETURN:
-                code_writer.writeReturn()
-            else:
-                raise Exception(f"Unsupported command: {parser.current_line}")
+    translate_commands(code_writer, read_commands(vm_path), peephole_hits, comments)
+
+
+def count_words(
+    commands: list[Command], options: CodegenOptions, optimize_code: bool
+) -> int:
+    # コマンド列を変換したときの命令数（ラベルを除く）
+    scratch = CodeWriter(None, "Scratch.vm", options)
+    hits = Counter() if optimize_code else None
+    translate_commands(scratch, commands, hits, comments=False)
+    return sum(1 for line in scratch.lines if not line.startswith("("))
+
+
+@dataclass
+class Fragment:
+    # 1ファイル分の変換結果
+    lines: list[str]
+    used_routines: set[str]
+    peephole_hits: Counter
+
+
+def translate_fragment(
+    vm_path: str,
+    commands: list[Command] | None,
+    options: CodegenOptions,
+    optimize_code: bool,
+    comments: bool,
+) -> Fragment:
+    # ラベルはファイル単位なので、他のファイルと独立に（別プロセスでも）変換できる
+    options = replace(options, local_labels=True)
+    code_writer = CodeWriter(None, os.path.basename(vm_path), options)
+    hits = Counter() if optimize_code else None
+    if commands is None:
+        commands = read_commands(vm_path)
+    translate_commands(code_writer, commands, hits, comments)
+    # 断片は close() しないので、D に残ったスタックトップはここで書き戻す
+    code_writer.flushTos()
+    return Fragment(code_writer.lines, code_writer.used_routines, hits or Counter())
+
+
+def translate_fragments(
+    programs: dict[str, list[Command] | None],
+    options: CodegenOptions,
+    optimize_code: bool,
+    comments: bool,
+    jobs: int,
+) -> list[Fragment]:
+    # 結果は常に入力（ソート済み）の順に並ぶので、worker数によらず出力は同じ
+    jobs = jobs or available_cores()
+    args = (
+        list(programs),
+        list(programs.values()),
+        repeat(options),
+        repeat(optimize_code),
+        repeat(comments),
+    )
+    if jobs == 1 or len(programs) == 1:
+        return list(map(translate_fragment, *args))
+    with ProcessPoolExecutor(max_workers=min(jobs, len(programs))) as executor:
+        return list(executor.map(translate_fragment, *args))
+
+
+def translate_all(
+    code_writer: CodeWriter,
+    vm_files: list[str],
+    peephole_hits: Counter | None = None,
+    comments: bool = True,
+    dead_functions: DeadFunctionReport | None = None,
+    jobs: int | None = None,
+    read: Callable[[str], list[Command]] | None = None,
+) -> None:
+    # dead_functions を渡すと Sys.init から到達しない関数を出力しない
+    # jobs を指定するとファイルごとに（並列に）変換してからつなげる
+    # read を渡すと、コマンド列は最初にすべてそれで読み込む
+    if any(os.path.basename(path) == "Sys.vm" for path in vm_files):
+        code_writer.writeBootstrap()
+
+    # None のコマンド列は変換時に読み込む
+    programs: dict[str, list[Command] | None] = dict.fromkeys(vm_files)
+    if dead_functions is not None or read is not None:
+        read = read or read_commands
+        programs = {vm_path: read(vm_path) for vm_path in vm_files}
+    if dead_functions is not None:
+        programs = remove_dead_functions(programs, dead_functions)
+        removed = [c for body in dead_functions.removed.values() for c in body]
+        dead_functions.words_saved = count_words(
+            removed, code_writer.options, peephole_hits is not None
+        )
+
+    if jobs is None:
+        for vm_path, commands in programs.items():
+            code_writer.setFileName(os.path.basename(vm_path))
+            if commands is None:
+                commands = read_commands(vm_path)
+            translate_commands(code_writer, commands, peephole_hits, comments)
+        return
+
+    fragments = translate_fragments(
+        programs, code_writer.options, peephole_hits is not None, comments, jobs
+    )
+    for fragment in fragments:
+        code_writer.write(fragment.lines)
+        code_writer.used_routines |= fragment.used_routines
+        if peephole_hits is not None:
+            peephole_hits.update(fragment.peephole_hits)
 
 
 def main() -> None:
-    if len(sys.argv) != 2:
-        print("Usage: python vmtranslator.py <vm file or directory>")
-        sys.exit(1)
-    input_path = sys.argv[1]
-    vm_files, output_file = collect_vm_files(input_path)
-    with CodeWriter(output_file, os.path.basename(vm_files[0])) as code_writer:
-        if any(os.path.basename(path) == "Sys.vm" for path in vm_files):
-            code_writer.writeBootstrap()
-        for vm_path in vm_files:
-            translate_file(code_writer, vm_path)
+    arg_parser = argparse.ArgumentParser(description="VM translator")
+    arg_parser.add_argument(
+        "input_path", help="vm file or directory（- で標準入力から読み標準出力に書く）"
+    )
+    arg_parser.add_argument(
+        "--shared-routines",
+        action="store_true",
+        help="call/return/比較を共有ルーチンにしてコードサイズを減らす",
+    )
+    arg_parser.add_argument(
+        "--cache-tos",
+        action="store_true",
+        help="スタックトップを D レジスタに置いたまま変換する",
+    )
+    arg_parser.add_argument(
+        "--specialize",
+        action="store_true",
+        help="インデックスや定数に応じて命令数の少ないpush/popを選ぶ",
+    )
+    arg_parser.add_argument(
+        "--compact-prologue",
+        action="store_true",
+        help="ローカル変数の初期化をまとめて行い、多い場合は共有ループを使う",
+    )
+    arg_parser.add_argument(
+        "--prologue-loop-locals",
+        type=int,
+        default=CodegenOptions.prologue_loop_locals,
+        metavar="N",
+        help="共有の0埋めループを使うローカル変数の数（既定: %(default)s）",
+    )
+    arg_parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="よく現れるVMコマンド列をまとめて変換する",
+    )
+    arg_parser.add_argument(
+        "--remove-unused",
+        action="store_true",
+        help="Sys.init から呼ばれない関数を出力しない",
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="ファイルごとに並列変換するworker数（0 で利用可能なコア数。"
+        "ラベルはファイル単位になる）",
+    )
+    arg_parser.add_argument(
+        "--bootstrap",
+        action="store_true",
+        help="標準入力から読むときにブートストラップを出力する",
+    )
+    arg_parser.add_argument(
+        "--file-name",
+        default=STREAM_FILE_NAME,
+        help="標準入力から読むときの static 変数名に使うファイル名",
+    )
+    args = arg_parser.parse_args()
+    if args.jobs is not None and args.jobs < 0:
+        arg_parser.error("--jobs には0以上を指定する")
+
+    options = CodegenOptions(
+        shared_routines=args.shared_routines,
+        cache_tos=args.cache_tos,
+        specialize=args.specialize,
+        compact_prologue=args.compact_prologue,
+        prologue_loop_locals=args.prologue_loop_locals,
+    )
+    peephole_hits = Counter() if args.optimize else None
+    if args.input_path == STDIN_PATH:
+        if args.remove_unused or args.jobs is not None:
+            arg_parser.error("--remove-unused と --jobs は標準入力では使えない")
+        asm_lines = translate_stream(
+            sys.stdin, args.file_name, options, peephole_hits, bootstrap=args.bootstrap
+        )
+        for line in asm_lines:
+            sys.stdout.write(line + "\n")
+        if peephole_hits is not None:
+            print(format_hits(peephole_hits), file=sys.stderr)
+        return
+
+    vm_files, output_file = collect_vm_files(args.input_path)
+    dead_functions = DeadFunctionReport() if args.remove_unused else None
+    with CodeWriter(output_file, os.path.basename(vm_files[0]), options) as code_writer:
+        translate_all(
+            code_writer,
+            vm_files,
+            peephole_hits,
+            dead_functions=dead_functions,
+            jobs=args.jobs,
+        )
 
     print(f"Translation completed: {output_file}")
+    if peephole_hits is not None:
+        print(format_hits(peephole_hits))
+    if dead_functions is not None:
+        print(dead_functions)
 
 
 if __name__ == "__main__":
@@ -6,16 +6,23 @@ from symbol import IdentifierKind, SymbolTable
 from xml.etree.ElementTree import Element
 from vm_writer import ArithmeticCommand, VMWriter, Segment
 from char_code import CHAR_TO_CODE
+from constant_fold import (
+    FALSE_VALUE,
+    INT_MIN,
+    TRUE_VALUE,
+    fold_binary,
+    fold_unary,
+)
 
 
 import logging
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.DEBUG, format="%(asctime)s %(name)s %(levelname)s: %(message)s"
-)
 
 
+# 出力するVMコードが変わる変更をしたら上げる（コンパイルキャッシュのキー）
+COMPILER_VERSION = "4"
+
 PRIMITIVE_TYPE = (KeyWord.INT.value, KeyWord.CHAR.value, KeyWord.BOOLEAN.value)
 
 ARITHMETIC_OP_MAP = {
@@ -95,21 +102,67 @@ class SymbolCategory(Enum):
 
 LABEL_BASE = "L{0}"
 
+# 定数との乗算を加算の列に展開するときのVMコマンド数の上限（超えたら Math.multiply）
+MULTIPLY_INLINE_LIMIT = 30
+
+# 片方が定数の二項演算の簡約（演算子, 定数）-> 結果
+#   KEEP: もう一方の値そのまま / NEG: もう一方の符号反転
+#   ZERO, ONES: もう一方は評価だけして捨て、0 / -1 にする
+KEEP, NEG, ZERO, ONES = "keep", "neg", "zero", "ones"
+RIGHT_IDENTITY = {
+    (Symbol.PLUS.value, 0): KEEP,
+    (Symbol.MINUS.value, 0): KEEP,
+    (Symbol.PIPE.value, 0): KEEP,
+    (Symbol.ASTERISK.value, 1): KEEP,
+    (Symbol.AMPERSAND.value, TRUE_VALUE): KEEP,
+    (Symbol.ASTERISK.value, -1): NEG,
+    (Symbol.ASTERISK.value, 0): ZERO,
+    (Symbol.AMPERSAND.value, 0): ZERO,
+    (Symbol.PIPE.value, TRUE_VALUE): ONES,
+}
+LEFT_IDENTITY = {
+    (Symbol.PLUS.value, 0): KEEP,
+    (Symbol.PIPE.value, 0): KEEP,
+    (Symbol.ASTERISK.value, 1): KEEP,
+    (Symbol.AMPERSAND.value, TRUE_VALUE): KEEP,
+    (Symbol.MINUS.value, 0): NEG,
+    (Symbol.ASTERISK.value, -1): NEG,
+    (Symbol.ASTERISK.value, 0): ZERO,
+    (Symbol.AMPERSAND.value, 0): ZERO,
+    (Symbol.PIPE.value, TRUE_VALUE): ONES,
+}
+
 
 class CompilationEngine:
-    def __init__(self, tokenizer: JackTokenizer, fileName: str) -> None:
+    def __init__(
+        self,
+        tokenizer: JackTokenizer,
+        fileName: str,
+        poolStrings: bool = False,
+        foldConstants: bool = False,
+    ) -> None:
         self.tokenizer = tokenizer
         self.classTable = SymbolTable()
         self.subroutineTable = SymbolTable()
         self.currentClassName: Optional[str] = None
         self.labelNum = 0
         self.vmWriter = VMWriter(fileName)
+        # 文字列定数をクラスごとに一度だけ作り、static 変数に保持して使い回す。
+        # 同じリテラルは同じインスタンスになるので、書き換える場合は使えない
+        self.poolStrings = poolStrings
+        # リテラル -> プール内の番号（static の番号はクラスの static 変数の後ろ）
+        self.stringPool: dict[str, int] = {}
+        # 定数式の畳み込み・恒等式の簡約・定数との乗算の展開を行う
+        self.foldConstants = foldConstants
 
         if self.tokenizer.hasMoreTokens():
             self.tokenizer.advance()
         else:
             raise Exception("this file is empty")
 
+    def close(self) -> None:
+        self.vmWriter.close()
+
     def compileClass(self) -> None:
 
         self._eatSpecified(KeyWord.CLASS.value)
@@ -368,21 +421,106 @@ class CompilationEngine:
         self.vmWriter.writeReturn()
 
     def compileExpression(self) -> None:
-        self.compileTerm()
+        value = self._compileExpression()
+        if value is not None:
+            self._writeConstant(value)
+
+    def _compileExpression(self) -> Optional[int]:
+        # 定数になった場合は何も出力せずにその値を返す
+        left = self._compileTerm()
         while (
             self._currentTokenValue() in ARITHMETIC_OP_MAP
             or self._currentTokenValue() in OS_OP_MAP
         ):
-            if self._currentTokenValue() in ARITHMETIC_OP_MAP:
-                op = ARITHMETIC_OP_MAP[self._currentTokenValue()]
-                self._eatCurrentToken()
-                self.compileTerm()
-                self.vmWriter.writeArithmetic(op)
-            elif self._currentTokenValue() in OS_OP_MAP:
-                opOs = OS_OP_MAP[self._currentTokenValue()]
-                self._eatCurrentToken()
-                self.compileTerm()
-                self.vmWriter.writeCall(opOs, 2)
+            op = self._currentTokenValue()
+            self._eatCurrentToken()
+            mark = self.vmWriter.mark()
+            right = self._compileTerm()
+            left = self._compileBinary(op, left, right, mark)
+        return left
+
+    def _compileBinary(
+        self, op: str, left: Optional[int], right: Optional[int], mark: int
+    ) -> Optional[int]:
+        # left のコードは mark より前、right のコードは mark 以降に出力済み
+        if left is not None and right is not None:
+            folded = fold_binary(op, left, right)
+            if folded is not None:
+                return folded
+
+        identity = None
+        if left is None and right is not None:
+            identity = RIGHT_IDENTITY.get((op, right))
+        elif left is not None and right is None:
+            identity = LEFT_IDENTITY.get((op, left))
+        if identity == KEEP:
+            return None
+        if identity == NEG:
+            self.vmWriter.writeArithmetic(ArithmeticCommand.NEG)
+            return None
+        if identity in (ZERO, ONES):
+            # 呼び出しの副作用があり得るので、評価した値を捨てるだけにする
+            self.vmWriter.writePop(Segment.TEMP, 0)
+            return FALSE_VALUE if identity == ZERO else TRUE_VALUE
+
+        if op == Symbol.ASTERISK.value and (left is None) != (right is None):
+            factor = left if left is not None else right
+            if self._writeMultiplyByConstant(factor):
+                return None
+
+        if left is not None:
+            # 右辺のコードの前に左辺の定数を差し込む
+            tail = self.vmWriter.takeFrom(mark)
+            self._writeConstant(left)
+            self.vmWriter.putBack(tail)
+        if right is not None:
+            self._writeConstant(right)
+        if op in ARITHMETIC_OP_MAP:
+            self.vmWriter.writeArithmetic(ARITHMETIC_OP_MAP[op])
+        else:
+            self.vmWriter.writeCall(OS_OP_MAP[op], 2)
+        return None
+
+    def _writeMultiplyByConstant(self, factor: int) -> bool:
+        # スタックトップの値に factor を掛ける。2倍と加算の列（上位ビットから）で求め、
+        # temp 1 に途中の値、temp 2 に元の値を置く。長くなる場合は展開しない
+        if factor == INT_MIN:
+            return False
+        bits = bin(abs(factor))[3:]
+        # 元の値を足し戻すビットがなければ（2の累乗）temp 2 には置かない
+        keep = "1" in bits
+        cost = 2 * keep + 4 * len(bits) + 2 * bits.count("1") + (factor < 0)
+        if cost > MULTIPLY_INLINE_LIMIT:
+            return False
+
+        if keep:
+            self.vmWriter.writePop(Segment.TEMP, 2)
+            self.vmWriter.writePush(Segment.TEMP, 2)
+        for bit in bits:
+            self.vmWriter.writePop(Segment.TEMP, 1)
+            self.vmWriter.writePush(Segment.TEMP, 1)
+            self.vmWriter.writePush(Segment.TEMP, 1)
+            self.vmWriter.writeArithmetic(ArithmeticCommand.ADD)
+            if bit == "1":
+                self.vmWriter.writePush(Segment.TEMP, 2)
+                self.vmWriter.writeArithmetic(ArithmeticCommand.ADD)
+        if factor < 0:
+            self.vmWriter.writeArithmetic(ArithmeticCommand.NEG)
+        return True
+
+    def _writeConstant(self, value: int) -> None:
+        # VMの push constant は 0〜32767 なので、負の数は not / neg で作る
+        if value >= 0:
+            self.vmWriter.writePush(Segment.CONSTANT, value)
+        elif value == TRUE_VALUE:
+            self.vmWriter.writePush(Segment.CONSTANT, 0)
+            self.vmWriter.writeArithmetic(ArithmeticCommand.NOT)
+        elif value == INT_MIN:
+            self.vmWriter.writePush(Segment.CONSTANT, ~INT_MIN)
+            self.vmWriter.writeArithmetic(ArithmeticCommand.NOT)
+        else:
+            self.vmWriter.writePush(Segment.CONSTANT, -value)
+            self.vmWriter.writeArithmetic(ArithmeticCommand.NEG)
 
     def compileExpressionList(self) -> int:
         cnt = 0
@@ -400,93 +538,99 @@ class CompilationEngine:
         return cnt
 
     def compileTerm(self) -> None:
+        value = self._compileTerm()
+        if value is not None:
+            self._writeConstant(value)
+
+    def _compileTerm(self) -> Optional[int]:
+        # 定数になった場合は何も出力せずにその値を返す
         tokenType = self.tokenizer.tokenType()
 
         if tokenType == TokenType.INT_CONST:
-            self.vmWriter.writePush(Segment.CONSTANT, self.tokenizer.intVal())
+            value = self.tokenizer.intVal()
             self._eatCurrentToken()
-            return
+            return self._constantTerm(value)
 
         if tokenType == TokenType.STRING_CONST:
             stringVal = self.tokenizer.stringVal()
-            self.vmWriter.writePush(Segment.CONSTANT, len(stringVal))
-            self.vmWriter.writeCall("String.new", 1)
-            self.vmWriter.writePop(Segment.TEMP, 0)
-            for c in stringVal:
-                self.vmWriter.writePush(Segment.TEMP, 0)
-                self.vmWriter.writePush(Segment.CONSTANT, CHAR_TO_CODE[c])
-                self.vmWriter.writeCall("String.appendChar", 2)
-                self.vmWriter.writePop(Segment.TEMP, 0)
-            self.vmWriter.writePush(Segment.TEMP, 0)
+            if self.poolStrings:
+                self._writePooledString(stringVal)
+            else:
+                self._writeNewString(stringVal)
             self._eatCurrentToken()
-            return
+            return None
 
         if self._currentTokenValue() in KEYWORD_CONSTANT:
             keyword = self._currentTokenValue()
             self._eatCurrentToken()
             if keyword == KeyWord.TRUE.value:
-                self.vmWriter.writePush(Segment.CONSTANT, 0)
-                self.vmWriter.writeArithmetic(ArithmeticCommand.NOT)
+                return self._constantTerm(TRUE_VALUE)
             elif keyword in (KeyWord.FALSE.value, KeyWord.NULL.value):
-                self.vmWriter.writePush(Segment.CONSTANT, 0)
+                return self._constantTerm(FALSE_VALUE)
             elif keyword == KeyWord.THIS.value:
                 self.vmWriter.writePush(Segment.POINTER, 0)
-            return
+            return None
 
         if self._currentTokenValue() == Symbol.LPAREN.value:
             self._eatSpecified(Symbol.LPAREN.value)
-            self.compileExpression()
+            value = self._compileExpression()
             self._eatSpecified(Symbol.RPAREN.value)
-            return
+            return value
 
         if self._currentTokenValue() in (Symbol.MINUS.value, Symbol.TILDE.value):
             op = self._currentTokenValue()
             self._eatCurrentToken()
-            self.compileTerm()
+            value = self._compileTerm()
+            if value is not None:
+                return fold_unary(op, value)
             if op == Symbol.MINUS.value:
                 self.vmWriter.writeArithmetic(ArithmeticCommand.NEG)
             else:
                 self.vmWriter.writeArithmetic(ArithmeticCommand.NOT)
-            return
+            return None
 
         if tokenType != TokenType.IDENTIFIER:
             raise Exception(f"Invalid syntax {self._currentTokenValue()}")
 
-        # 先読みが必要なもの
-        prevToken = self._currentTokenValue()
+        # 識別子の次のトークンを先読みして、配列・呼び出し・変数を見分ける
+        name = self._currentTokenValue()
+        following = self.tokenizer.peek(1)
+        lookahead = None
+        if following is not None and following.type == TokenType.SYMBOL:
+            lookahead = following.value
         self._eatSpecifiedTokenType(TokenType.IDENTIFIER)
-        if self._currentTokenValue() == Symbol.LBRACKET.value:
+        if lookahead == Symbol.LBRACKET.value:
             self._eatSpecified(Symbol.LBRACKET.value)
-            if not self._hasSymbol(prevToken):
+            if not self._hasSymbol(name):
                 raise Exception(f"Invalid syntax {self._currentTokenValue()}")
-            seg, index, _ = self._findSymbol(prevToken)
+            seg, index, _ = self._findSymbol(name)
             self.vmWriter.writePush(seg, index)
             self.compileExpression()
             self.vmWriter.writeArithmetic(ArithmeticCommand.ADD)
             self.vmWriter.writePop(Segment.POINTER, 1)
             self.vmWriter.writePush(Segment.THAT, 0)
             self._eatSpecified(Symbol.RBRACKET.value)
-        elif self._currentTokenValue() == Symbol.LPAREN.value:
+        elif lookahead == Symbol.LPAREN.value:
             # invoke its own method
             if not self.currentClassName:
                 raise Exception("Class name must be set before invoking subroutines")
             self._eatSpecified(Symbol.LPAREN.value)
-            qualifiedName = f"{self.currentClassName}{Symbol.DOT.value}{prevToken}"
+            qualifiedName = f"{self.currentClassName}{Symbol.DOT.value}{name}"
 
             self.vmWriter.writePush(Segment.POINTER, 0)
 
             argNum = self.compileExpressionList()
             self.vmWriter.writeCall(qualifiedName, argNum + 1)
             self._eatSpecified(Symbol.RPAREN.value)
-        elif self._currentTokenValue() == Symbol.DOT.value:
+        elif lookahead == Symbol.DOT.value:
             self._eatSpecified(Symbol.DOT.value)
             subroutineIdentifier = self._currentTokenValue()
 
             # call method on instance stored in symbol tables
             argOffset = 0
-            subroutineName = f"{prevToken}.{subroutineIdentifier}"
-            if self._hasSymbol(prevToken):
-                seg, index, typeName = self._findSymbol(prevToken)
+            subroutineName = f"{name}.{subroutineIdentifier}"
+            if self._hasSymbol(name):
+                seg, index, typeName = self._findSymbol(name)
                 self.vmWriter.writePush(seg, index)
                 subroutineName = f"{typeName}.{subroutineIdentifier}"
                 argOffset = 1
@@ -499,9 +643,42 @@ class CompilationEngine:
             self._eatSpecified(Symbol.RPAREN.value)
         else:
             # 変数のみ
-            seg, index, _ = self._findSymbol(prevToken)
+            seg, index, _ = self._findSymbol(name)
             self.vmWriter.writePush(seg, index)
 
+    def _constantTerm(self, value: int) -> Optional[int]:
+        # 畳み込まない場合は定数をその場で出力する（以降の簡約も起きない）
+        if self.foldConstants:
+            return value
+        self._writeConstant(value)
+        return None
+
+    def _writeNewString(self, stringVal: str) -> None:
+        self.vmWriter.writePush(Segment.CONSTANT, len(stringVal))
+        self.vmWriter.writeCall("String.new", 1)
+        self.vmWriter.writePop(Segment.TEMP, 0)
+        for c in stringVal:
+            self.vmWriter.writePush(Segment.TEMP, 0)
+            self.vmWriter.writePush(Segment.CONSTANT, CHAR_TO_CODE[c])
+            self.vmWriter.writeCall("String.appendChar", 2)
+            self.vmWriter.writePop(Segment.TEMP, 0)
+        self.vmWriter.writePush(Segment.TEMP, 0)
+
+    def _writePooledString(self, stringVal: str) -> None:
+        # 初めて評価したときだけ文字列を作り、以降は static の参照を push する
+        if stringVal not in self.stringPool:
+            self.stringPool[stringVal] = len(self.stringPool)
+        index = self.classTable.varCount(IdentifierKind.STATIC)
+        index += self.stringPool[stringVal]
+
+        labelBuilt = self._createLabel()
+        self.vmWriter.writePush(Segment.STATIC, index)
+        self.vmWriter.writeIf(labelBuilt)
+        self._writeNewString(stringVal)
+        self.vmWriter.writePop(Segment.STATIC, index)
+        self.vmWriter.writeLabel(labelBuilt)
+        self.vmWriter.writePush(Segment.STATIC, index)
+
     def _compileType(self) -> None:
         if (
             self.tokenizer.tokenType() == TokenType.KEYWORD
@@ -562,15 +739,4 @@ class CompilationEngine:
         raise Exception(f"{name} is not found in symbol table")
 
     def _currentTokenValue(self) -> str:
-        token_type = self.tokenizer.tokenType()
-        if token_type == TokenType.STRING_CONST:
-            return self.tokenizer.stringVal()
-        if token_type == TokenType.INT_CONST:
-            return str(self.tokenizer.intVal())
-        if token_type == TokenType.IDENTIFIER:
-            return self.tokenizer.identifier()
-        if token_type == TokenType.KEYWORD:
-            return self.tokenizer.keyWord().value
-        if token_type == TokenType.SYMBOL:
-            return self.tokenizer.symbol()
-        raise Exception(f"Unsupported token type: {token_type}")
+        return self.tokenizer.tokenValue()
@@ -0,0 +1,149 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+from functools import lru_cache
+
+from compilation_engine import COMPILER_VERSION
+
+DEFAULT_CACHE_DIR = ".jack_cache"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+VM_SUFFIX = ".vm"
+POOL_SUFFIX = ".pool.json"
+
+# 出力に影響するコンパイラのモジュール
+COMPILER_SOURCES = (
+    "char_code.py",
+    "compilation_engine.py",
+    "constant_fold.py",
+    "jack_tokenizer.py",
+    "symbol.py",
+    "vm_writer.py",
+)
+
+
+@lru_cache(maxsize=None)
+def compiler_hash() -> str:
+    # バージョンを上げ忘れても、コンパイラを書き換えればキャッシュが無効になる
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in COMPILER_SOURCES:
+        with open(os.path.join(directory, name), "rb") as f:
+            digest.update(f.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CompileCache:
+    # ソースのハッシュとコンパイラのバージョンをキーに、VMコードをそのまま
+    # <key>.vm として保存する。文字列プールがあれば <key>.pool.json に置く
+    def __init__(
+        self,
+        directory: str = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        hash_compiler: bool = False,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = COMPILER_VERSION
+        if hash_compiler:
+            self.version += ":" + compiler_hash()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(
+        self, source: bytes, pool_strings: bool = False, fold_constants: bool = False
+    ) -> str:
+        # バージョンと出力が変わるオプションもキーに含めるので、
+        # キーが一致したエントリはそのまま使える
+        digest = hashlib.sha256()
+        digest.update(self.version.encode())
+        digest.update(b"\0")
+        digest.update(b"pool-strings" if pool_strings else b"")
+        digest.update(b"\0")
+        digest.update(b"fold-constants" if fold_constants else b"")
+        digest.update(b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, key + suffix)
+
+    def restore(self, key: str, vm_path: str) -> dict[str, int] | None:
+        # キャッシュにあれば .vm を書き出して文字列プールを返す
+        cached_path = self._path(key, VM_SUFFIX)
+        try:
+            with open(cached_path, "r", encoding="utf-8", newline="") as f:
+                vm = f.read()
+            string_pool = self._readPool(key)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        # 最近使ったものとして残るように更新時刻を進める
+        os.utime(cached_path)
+        try:
+            with open(vm_path, "r", encoding="utf-8", newline="") as f:
+                unchanged = f.read() == vm
+        except OSError:
+            unchanged = False
+        # 内容が同じなら書き込まず、.vm の更新時刻も変えない
+        if not unchanged:
+            shutil.copyfile(cached_path, vm_path)
+        return string_pool
+
+    def _readPool(self, key: str) -> dict[str, int]:
+        try:
+            with open(self._path(key, POOL_SUFFIX), "r") as f:
+                string_pool = json.load(f)
+        except FileNotFoundError:
+            return {}
+        if not isinstance(string_pool, dict):
+            raise ValueError(f"invalid string pool: {key}")
+        return string_pool
+
+    def store(self, key: str, vm_path: str, string_pool: dict[str, int]) -> None:
+        # 並列に書き込まれても壊れないように一時ファイルから置き換える。
+        # .vm が見えた時点でプールも揃っているよう、プールを先に置く
+        suffix = f".{os.getpid()}.tmp"
+        if string_pool:
+            pool_path = self._path(key, POOL_SUFFIX)
+            with open(pool_path + suffix, "w") as f:
+                json.dump(string_pool, f, separators=(",", ":"))
+            os.replace(pool_path + suffix, pool_path)
+        cached_path = self._path(key, VM_SUFFIX)
+        shutil.copyfile(vm_path, cached_path + suffix)
+        os.replace(cached_path + suffix, cached_path)
+
+    def evict(self) -> int:
+        # .vm の更新時刻が古いエントリから、プールと一緒に削除する
+        entries: dict[str, list] = {}
+        for name in os.listdir(self.directory):
+            # 書き込み途中の一時ファイル（<key>.vm.<pid>.tmp）は対象にしない
+            key, _, suffix = name.partition(".")
+            suffix = "." + suffix
+            if suffix not in (VM_SUFFIX, POOL_SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entry = entries.setdefault(key, [0.0, 0])
+            if suffix == VM_SUFFIX:
+                entry[0] = stat.st_mtime
+            entry[1] += stat.st_size
+
+        total = sum(size for _, size in entries.values())
+        removed = 0
+        for key, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            for suffix in (POOL_SUFFIX, VM_SUFFIX):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self._path(key, suffix))
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,49 @@
+from typing import Optional
+
+from jack_tokenizer import Symbol
+
+# Hack の16ビット整数（2の補数）として計算する
+INT_MIN = -32768
+INT_MAX = 32767
+TRUE_VALUE = -1
+FALSE_VALUE = 0
+
+
+def wrap16(value: int) -> int:
+    return ((value - INT_MIN) & 0xFFFF) + INT_MIN
+
+
+def fold_unary(op: str, value: int) -> int:
+    if op == Symbol.MINUS.value:
+        return wrap16(-value)
+    if op == Symbol.TILDE.value:
+        return ~value
+    raise Exception(f"Unsupported unary operator: {op}")
+
+
+def fold_binary(op: str, x: int, y: int) -> Optional[int]:
+    # 実行時と同じ結果になるものだけを計算する。できなければ None
+    if op == Symbol.PLUS.value:
+        return wrap16(x + y)
+    if op == Symbol.MINUS.value:
+        return wrap16(x - y)
+    if op == Symbol.ASTERISK.value:
+        return wrap16(x * y)
+    if op == Symbol.SLASH.value:
+        # 0除算は実行時エラー、INT_MIN は Math.abs で正にならないので残す
+        if y == 0 or INT_MIN in (x, y):
+            return None
+        quotient = abs(x) // abs(y)
+        return -quotient if (x < 0) != (y < 0) else quotient
+    if op == Symbol.AMPERSAND.value:
+        return x & y
+    if op == Symbol.PIPE.value:
+        return x | y
+    # 比較は VM と同じく x - y（16ビット）の符号で判定する
+    if op == Symbol.LT.value:
+        return TRUE_VALUE if wrap16(x - y) < 0 else FALSE_VALUE
+    if op == Symbol.GT.value:
+        return TRUE_VALUE if wrap16(x - y) > 0 else FALSE_VALUE
+    if op == Symbol.EQ.value:
+        return TRUE_VALUE if x == y else FALSE_VALUE
+    return None
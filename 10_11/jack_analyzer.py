@@ -1,11 +1,24 @@
+import argparse
 import io
+import logging
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import repeat
 from typing import Iterable
 from xml.etree.ElementTree import Element
 
 from compilation_engine import CompilationEngine
-from jack_tokenizer import JackTokenizer
+from compile_cache import DEFAULT_CACHE_DIR, CompileCache
+from jack_tokenizer import JackTokenizer, TokenizedSource
+
+
+def available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
 
 
 def collect_jack_files(input_path: str) -> list[str]:
@@ -51,27 +64,190 @@ def _indent(element: Element, level: int = 0) -> None:
             element.tail = indent
 
 
-def compile_file(jack_path: str) -> None:
-    tokenizer = JackTokenizer(jack_path)
-    engine = CompilationEngine(tokenizer, jack_path[:-5] + ".vm")
-    engine.compileClass()
-
-
-def process_files(jack_files: Iterable[str]) -> None:
-    for jack_path in jack_files:
-        compile_file(jack_path)
-        print(f"Compiled: {jack_path}")
+def compile_file(
+    jack_path: str,
+    pool_strings: bool = False,
+    cache: CompileCache | None = None,
+    tokenized: TokenizedSource | None = None,
+    fold_constants: bool = False,
+) -> dict[str, int]:
+    # 文字列プールの内容（リテラル -> プール内の番号）を返す
+    # tokenized を渡すとソースを読み直さずにそのトークン列をコンパイルする
+    vm_path = jack_path[:-5] + ".vm"
+    key = None
+    if cache is not None:
+        with open(jack_path, "rb") as f:
+            key = cache.key(f.read(), pool_strings, fold_constants)
+        string_pool = cache.restore(key, vm_path)
+        if string_pool is not None:
+            return string_pool
+
+    # 失敗した場合は中途半端な出力や前回の .vm を残さない
+    try:
+        tokenizer = JackTokenizer(jack_path, tokenized)
+        engine = CompilationEngine(tokenizer, vm_path, pool_strings, fold_constants)
+        try:
+            engine.compileClass()
+        except Exception as e:
+            # どこで失敗したか分かるように行番号を付ける
+            raise Exception(f"line {tokenizer.lineNumber()}: {e}") from e
+        engine.close()
+    except Exception:
+        if os.path.exists(vm_path):
+            os.remove(vm_path)
+        raise
+    if key is not None:
+        cache.store(key, vm_path, engine.stringPool)
+    return engine.stringPool
+
+
+def format_string_pool(jack_path: str, pool: dict[str, int]) -> str:
+    chars = sum(len(literal) for literal in pool)
+    return (
+        f"  String pool: {len(pool)} literals ({chars} chars)"
+        f" in {os.path.basename(jack_path)}"
+    )
+
+
+@dataclass
+class CompileResult:
+    # 1ファイル分のコンパイル結果。失敗したときは error にメッセージが入る
+    jack_path: str
+    string_pool: dict[str, int] = field(default_factory=dict)
+    error: str | None = None
+    elapsed: float = 0.0
+    cached: bool = False
+
+
+def compile_result(
+    jack_path: str,
+    pool_strings: bool = False,
+    cache_dir: str | None = None,
+    hash_compiler: bool = False,
+    fold_constants: bool = False,
+) -> CompileResult:
+    # 例外は結果に記録し、他のファイルのコンパイルは続ける
+    start = time.perf_counter()
+    result = CompileResult(jack_path)
+    cache = None
+    if cache_dir is not None:
+        cache = CompileCache(cache_dir, hash_compiler=hash_compiler)
+    try:
+        result.string_pool = compile_file(
+            jack_path, pool_strings, cache, fold_constants=fold_constants
+        )
+    except Exception as e:
+        result.error = str(e)
+    result.elapsed = time.perf_counter() - start
+    result.cached = cache is not None and cache.hits > 0
+    return result
+
+
+def process_files(
+    jack_files: Iterable[str],
+    pool_strings: bool = False,
+    jobs: int | None = None,
+    cache_dir: str | None = None,
+    hash_compiler: bool = False,
+    fold_constants: bool = False,
+) -> list[CompileResult]:
+    # クラスは VM レベルで独立しているので、ファイルごとに並列にコンパイルできる。
+    # 結果は常に入力（ソート済み）の順に並ぶので、worker数によらず出力は同じ
+    # cache_dir を指定すると、変更のないファイルは前回の出力を再利用する
+    jack_files = list(jack_files)
+    args = (
+        jack_files,
+        repeat(pool_strings),
+        repeat(cache_dir),
+        repeat(hash_compiler),
+        repeat(fold_constants),
+    )
+    if jobs is not None:
+        jobs = jobs or available_cores()
+    if jobs is None or jobs == 1 or len(jack_files) <= 1:
+        results = list(map(compile_result, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(jack_files))) as executor:
+            results = list(executor.map(compile_result, *args))
+    if cache_dir is not None:
+        CompileCache(cache_dir).evict()
+
+    for result in results:
+        if result.error is not None:
+            print(f"Error: {result.jack_path}: {result.error}")
+            continue
+        status = "Cached" if result.cached else "Compiled"
+        print(f"{status}: {result.jack_path}")
+        if pool_strings:
+            print(format_string_pool(result.jack_path, result.string_pool))
+    return results
+
+
+def format_summary(results: list[CompileResult], elapsed: float) -> str:
+    failed = sum(1 for result in results if result.error is not None)
+    cached = sum(1 for result in results if result.cached)
+    cpu = sum(result.elapsed for result in results)
+    return (
+        f"Compiled {len(results) - failed} of {len(results)} files"
+        f" ({failed} failed, {cached} cached) in {elapsed:.3f}s"
+        f" (per-file total {cpu:.3f}s)"
+    )
 
 
 def main() -> None:
-    if len(sys.argv) != 2:
-        print("Usage: python jack_analyzer.py <jack file or directory>")
+    logging.basicConfig(
+        level=logging.DEBUG, format="%(asctime)s %(name)s %(levelname)s: %(message)s"
+    )
+    arg_parser = argparse.ArgumentParser(description="Jack compiler")
+    arg_parser.add_argument("input_path", help="jack file or directory")
+    arg_parser.add_argument(
+        "--pool-strings",
+        action="store_true",
+        help="文字列定数をクラスごとに一度だけ作って使い回す（書き換える場合は不可）",
+    )
+    arg_parser.add_argument(
+        "--fold-constants",
+        action="store_true",
+        help="定数式を畳み込み、定数との乗算を加算の列に展開する",
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="ファイルごとに並列コンパイルするworker数（0 で利用可能なコア数）",
+    )
+    arg_parser.add_argument(
+        "--cache",
+        nargs="?",
+        const=DEFAULT_CACHE_DIR,
+        default=None,
+        metavar="DIR",
+        help=f"変更のないファイルは前回の出力を再利用する（既定: {DEFAULT_CACHE_DIR}）",
+    )
+    arg_parser.add_argument(
+        "--cache-hash-compiler",
+        action="store_true",
+        help="コンパイラ自体のソースのハッシュもキャッシュのキーに含める",
+    )
+    args = arg_parser.parse_args()
+    if args.jobs is not None and args.jobs < 0:
+        arg_parser.error("--jobs には0以上を指定する")
+
+    jack_files = collect_jack_files(args.input_path)
+    start = time.perf_counter()
+    results = process_files(
+        jack_files,
+        args.pool_strings,
+        args.jobs,
+        args.cache,
+        args.cache_hash_compiler,
+        args.fold_constants,
+    )
+    print(format_summary(results, time.perf_counter() - start))
+    if any(result.error is not None for result in results):
         sys.exit(1)
 
-    input_path = sys.argv[1]
-    jack_files = collect_jack_files(input_path)
-    process_files(jack_files)
-
 
 if __name__ == "__main__":
     main()
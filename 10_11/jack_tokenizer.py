@@ -1,6 +1,6 @@
 from enum import Enum
 import re
-from typing import Optional
+from typing import NamedTuple, Optional
 
 
 class TokenType(Enum):
@@ -84,83 +84,151 @@ TOKEN_REGEX = re.compile(
     + IDENTIFIER_PATTERN
 )
 
-SKIP_REGEX = re.compile(r"(\s+|//.*|\/\*[\s\S]*?\*\/)")
+SKIP_PATTERN = r"(?P<SKIP>\s+|//.*|\/\*[\s\S]*?\*\/)"
+SKIP_REGEX = re.compile(SKIP_PATTERN)
+
+# 空白・コメントを先に試し、続けてトークンを判定する1本の正規表現
+MASTER_REGEX = re.compile(SKIP_PATTERN + "|" + TOKEN_REGEX.pattern)
+
+KEYWORD_BY_LEXEME = {k.value: k for k in KeyWord}
+
+
+class Token(NamedTuple):
+    type: TokenType
+    # 文字列定数は引用符を除いた値、それ以外は字句そのもの
+    value: str
+    # ソース中の開始位置
+    position: int
+
+
+def tokenize(source: str) -> tuple[list[Token], int | None]:
+    # ソース全体を一度だけ走査してトークン列にする。
+    # 解釈できない文字があればそこで止め、その位置を返す
+    tokens: list[Token] = []
+    append = tokens.append
+    match = MASTER_REGEX.match
+    index = 0
+    length = len(source)
+    while index < length:
+        m = match(source, index)
+        if not m:
+            return tokens, index
+        kind = m.lastgroup
+        if kind != "SKIP":
+            lexeme = m.group()
+            if kind == "STRING_CONST":
+                append(Token(TokenType.STRING_CONST, lexeme[1:-1], index))
+            else:
+                append(Token(TokenType[kind], lexeme, index))
+        index = m.end()
+    return tokens, None
+
+
+class TokenizedSource(NamedTuple):
+    source: str
+    tokens: list[Token]
+    error_position: int | None
+
+
+def tokenize_file(filepath: str) -> TokenizedSource:
+    with open(filepath, "r") as f:
+        source = f.read()
+    return TokenizedSource(source, *tokenize(source))
 
 
 class JackTokenizer:
-    def __init__(self, filepath: str) -> None:
-        with open(filepath, "r") as f:
-            source_with_comments = f.read()
-        self.source = source_with_comments
-        self.counter: int = 0
+    # NOTE: ソースは生成時にまとめてトークン列にし、以降は添字で参照する
+    # tokenized を渡すとファイルを読まずにそのトークン列を使う（書き換えはしない）
+    def __init__(self, filepath: str, tokenized: TokenizedSource | None = None) -> None:
+        if tokenized is None:
+            tokenized = tokenize_file(filepath)
+        self.source = tokenized.source
+        self.tokens = tokenized.tokens
+        self.error_position = tokenized.error_position
+        # 解釈できない文字がある場合は、そこまで進んだときに例外にする
+        self.count = len(self.tokens) + (self.error_position is not None)
+        self.index = -1
         self.current_token: str = ""
 
     def hasMoreTokens(self) -> bool:
-        next_index = self._skip_ignored_from(self.counter)
-        return next_index < len(self.source)
+        return self.index + 1 < self.count
 
     def advance(self) -> None:
-        self.counter = self._skip_ignored_from(self.counter)
-
-        if self.counter >= len(self.source):
+        if not self.hasMoreTokens():
             # バグ
             raise Exception("No more tokens")
 
-        token_match = TOKEN_REGEX.match(self.source, self.counter)
-        if not token_match:
+        self.index += 1
+        if self.index == len(self.tokens):
             raise Exception(f"Unsupported Token: {self.current_token}")
-        self.current_token = token_match.group(0)
-        self.counter = token_match.end()
-
-    def _skip_ignored_from(self, index: int) -> int:
-        length = len(self.source)
-        while index < length:
-            skip = SKIP_REGEX.match(self.source, index)
-            if not skip:
-                break
-            index = skip.end()
-        return index
-
-    def tokenType(self) -> TokenType:
-        mtc = TOKEN_REGEX.fullmatch(self.current_token)
-        if not mtc:
+        token = self.tokens[self.index]
+        if token.type == TokenType.STRING_CONST:
+            self.current_token = f'"{token.value}"'
+        else:
+            self.current_token = token.value
+
+    def peek(self, k: int = 1) -> Optional[Token]:
+        # k 個先のトークン（peek(0) は現在のトークン）。なければ None
+        index = self.index + k
+        if 0 <= index < len(self.tokens):
+            return self.tokens[index]
+        return None
+
+    def _current(self) -> Token:
+        if not 0 <= self.index < len(self.tokens):
             # これが発生すればバグ
-            raise Exception(f"Unsupported token: f{self.current_token}")
+            raise Exception("No current token")
+        return self.tokens[self.index]
 
-        # 予約語の場合を優先
-        if KeyWord.from_lexeme(self.current_token):
-            return TokenType.KEYWORD
-        return TokenType[mtc.lastgroup]
+    def tokenType(self) -> TokenType:
+        return self._current().type
+
+    def tokenValue(self) -> str:
+        return self._current().value
+
+    def lineNumber(self) -> int:
+        # 現在のトークンの行番号。解釈できない文字で止まったときはその文字の行
+        if 0 <= self.index < len(self.tokens):
+            position = self.tokens[self.index].position
+        elif self.index < 0:
+            position = 0
+        elif self.error_position is not None:
+            position = self.error_position
+        else:
+            position = len(self.source)
+        return self.source.count("\n", 0, position) + 1
 
     def keyWord(self) -> KeyWord:
-        if self.tokenType() != TokenType.KEYWORD:
+        token = self._current()
+        if token.type != TokenType.KEYWORD:
             # これが発生すればバグ
             raise Exception(f"Unsupported token: f{self.current_token}")
-        key = KeyWord.from_lexeme(self.current_token)
-        if not key:
-            raise Exception(f"Unsupported keyword {self.current_token}")
-        return key
+        return KEYWORD_BY_LEXEME[token.value]
 
     def symbol(self) -> str:
-        if self.tokenType() != TokenType.SYMBOL:
+        token = self._current()
+        if token.type != TokenType.SYMBOL:
             # これが発生すればバグ
             raise Exception(f"Unsupported token: f{self.current_token}")
-        return self.current_token
+        return token.value
 
     def identifier(self) -> str:
-        if self.tokenType() != TokenType.IDENTIFIER:
+        token = self._current()
+        if token.type != TokenType.IDENTIFIER:
             # これが発生すればバグ
             raise Exception(f"Unsupported token: f{self.current_token}")
-        return self.current_token
+        return token.value
 
     def intVal(self) -> int:
-        if self.tokenType() != TokenType.INT_CONST:
+        token = self._current()
+        if token.type != TokenType.INT_CONST:
             # これが発生すればバグ
             raise Exception(f"Unsupported token: f{self.current_token}")
-        return int(self.current_token)
+        return int(token.value)
 
     def stringVal(self) -> str:
-        if self.tokenType() != TokenType.STRING_CONST:
+        token = self._current()
+        if token.type != TokenType.STRING_CONST:
             # これが発生すればバグ
             raise Exception(f"Unsupported token: f{self.current_token}")
-        return self.current_token[1:-1]
+        return token.value
@@ -4,6 +4,9 @@ set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 JACK_ANALYZER="$SCRIPT_DIR/jack_analyzer.py"
+HACK_BUILD="$SCRIPT_DIR/../07_08/hack_build.py"
+EMULATOR="$SCRIPT_DIR/../07_08/hack_emulator.py"
+OS_ROOT="$SCRIPT_DIR/../12"
 SAMPLE_ROOT="$SCRIPT_DIR/sample"
 
 if [[ ! -d "$SAMPLE_ROOT" ]]; then
@@ -16,16 +19,23 @@ trap 'rm -rf "$TMP_ROOT"' EXIT
 
 status=0
 
+# サンプルのディレクトリに compile_options があれば、その引数を付けてコンパイルする
+sample_options() {
+  [[ -f "$1/compile_options" ]] && cat "$1/compile_options"
+  return 0
+}
+
 for target in "$SAMPLE_ROOT"/*; do
   [[ -d "$target" ]] || continue
   base_name="$(basename "$target")"
   work_dir="$TMP_ROOT/$base_name"
 
   cp -R "$target" "$work_dir"
-  find "$work_dir" -type f -name '*.xml' -delete
+  find "$work_dir" -type f \( -name '*.xml' -o -name '*.vm' \) -delete
 
   echo "Processing: $target"
-  python "$JACK_ANALYZER" "$work_dir" >/dev/null
+  # shellcheck disable=SC2046
+  python "$JACK_ANALYZER" $(sample_options "$target") "$work_dir" >/dev/null
 
   while IFS= read -r expected; do
     # Skip tokenizer outputs now that the analyzer only produces parse trees
@@ -44,7 +54,93 @@ for target in "$SAMPLE_ROOT"/*; do
       cat "$TMP_ROOT/diff" >&2
       status=1
     fi
-  done < <(find "$target" -type f -name '*.xml' | sort)
+  done < <(find "$target" -type f \( -name '*.xml' -o -name '*.vm' \) | sort)
+done
+
+# .tst のあるサンプルは足りない OS のクラスを ../12 から補ってビルドし、
+# エミュレータで実行した結果を .cmp と比べる。最適化した出力も同じ結果になる
+COMPILE_MODES=(
+  ""
+  "--fold-constants"
+)
+for mode in "${COMPILE_MODES[@]}"; do
+  for tst in "$SAMPLE_ROOT"/*/*.tst; do
+    [[ -f "$tst" ]] || continue
+    base_name="$(basename "$(dirname "$tst")")"
+    run_dir="$TMP_ROOT/run/$base_name"
+    rm -rf "$run_dir"
+    mkdir -p "$TMP_ROOT/run"
+    cp -R "$SAMPLE_ROOT/$base_name" "$run_dir"
+    for os_class in "$OS_ROOT"/*.jack; do
+      [[ -f "$run_dir/$(basename "$os_class")" ]] || cp "$os_class" "$run_dir/"
+    done
+
+    echo "Running: $base_name ${mode:-(default)}"
+    # shellcheck disable=SC2046,SC2086
+    python "$JACK_ANALYZER" $(sample_options "$run_dir") $mode "$run_dir" >/dev/null
+    python "$HACK_BUILD" "$run_dir" >/dev/null
+    if ! python "$EMULATOR" "$run_dir/$base_name.hack" >"$TMP_ROOT/emulator.log"; then
+      cat "$TMP_ROOT/emulator.log" >&2
+      status=1
+    fi
+  done
+done
+
+# --fold-constants では ConstantFold の乗算はすべて畳み込まれるか展開される
+FOLD_DIR="$TMP_ROOT/fold"
+cp -R "$SAMPLE_ROOT/ConstantFold" "$FOLD_DIR"
+python "$JACK_ANALYZER" --fold-constants "$FOLD_DIR" >/dev/null
+if grep -q "call Math.multiply" "$FOLD_DIR/Main.vm"; then
+  echo "Constant multiplication was not folded: $FOLD_DIR/Main.vm" >&2
+  status=1
+fi
+
+# 並列コンパイル（-j 0 は利用可能なコア数）でも出力は同じ
+for jobs in 0 2; do
+  JOBS_DIR="$TMP_ROOT/jobs$jobs"
+  cp -R "$SAMPLE_ROOT/Pong" "$JOBS_DIR"
+  python "$JACK_ANALYZER" -j "$jobs" "$JOBS_DIR" >/dev/null
+  for expected in "$SAMPLE_ROOT"/Pong/*.vm; do
+    if ! diff -u "$expected" "$JOBS_DIR/$(basename "$expected")"; then
+      echo "Mismatch with -j $jobs: $expected" >&2
+      status=1
+    fi
+  done
+done
+
+# --cache の2回目は全ファイルをキャッシュから復元し、出力は変わらない
+CACHE_DIR="$TMP_ROOT/cache"
+cp -R "$SAMPLE_ROOT/Pong" "$CACHE_DIR"
+python "$JACK_ANALYZER" --cache "$CACHE_DIR/.jack_cache" "$CACHE_DIR" >/dev/null
+find "$CACHE_DIR" -maxdepth 1 -name '*.vm' -delete
+if ! python "$JACK_ANALYZER" --cache "$CACHE_DIR/.jack_cache" "$CACHE_DIR" |
+  grep -q "(0 failed, 4 cached)"; then
+  echo "Cached compile did not reuse every class" >&2
+  status=1
+fi
+for expected in "$SAMPLE_ROOT"/Pong/*.vm; do
+  if ! diff -u "$expected" "$CACHE_DIR/$(basename "$expected")"; then
+    echo "Mismatch after restoring from the cache: $expected" >&2
+    status=1
+  fi
+done
+
+# コンパイルに失敗したクラスは .vm を残さない（前回の出力も消す）
+BROKEN_DIR="$TMP_ROOT/broken"
+mkdir -p "$BROKEN_DIR"
+printf 'class Broken {\n  function void f() {\n    let x = ;\n  }\n}\n' \
+  >"$BROKEN_DIR/Broken.jack"
+echo "stale" >"$BROKEN_DIR/Broken.vm"
+: >"$BROKEN_DIR/Empty.jack"
+if python "$JACK_ANALYZER" "$BROKEN_DIR" >/dev/null 2>&1; then
+  echo "Broken sources compiled without an error" >&2
+  status=1
+fi
+for vm_file in "$BROKEN_DIR/Broken.vm" "$BROKEN_DIR/Empty.vm"; do
+  if [[ -e "$vm_file" ]]; then
+    echo "Output left behind after a failed compile: $vm_file" >&2
+    status=1
+  fi
 done
 
 if [[ $status -ne 0 ]]; then
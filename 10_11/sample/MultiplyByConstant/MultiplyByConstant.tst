@@ -0,0 +1,15 @@
+// Runs MultiplyByConstant.hack on the CPU emulator.
+
+load MultiplyByConstant.hack,
+output-file MultiplyByConstant.out,
+compare-to MultiplyByConstant.cmp,
+
+set RAM[8000] -3,
+set RAM[8001] 1234,
+
+repeat 200000 {
+  ticktock;
+}
+
+output-list RAM[8010]%D1.7.1 RAM[8011]%D1.7.1 RAM[8012]%D1.7.1 RAM[8013]%D1.7.1 RAM[8014]%D1.7.1 RAM[8015]%D1.7.1 RAM[8016]%D1.7.1 RAM[8017]%D1.7.1 RAM[8018]%D1.7.1 RAM[8019]%D1.7.1 RAM[8020]%D1.7.1;
+output;
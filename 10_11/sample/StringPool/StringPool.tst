@@ -0,0 +1,12 @@
+// Runs StringPool.hack on the CPU emulator.
+
+load StringPool.hack,
+output-file StringPool.out,
+compare-to StringPool.cmp,
+
+repeat 200000 {
+  ticktock;
+}
+
+output-list RAM[8010]%D1.7.1 RAM[8011]%D1.7.1 RAM[8012]%D1.7.1 RAM[8013]%D1.7.1 RAM[8014]%D1.7.1 RAM[8015]%D1.7.1 RAM[8016]%D1.7.1 RAM[8017]%D1.7.1;
+output;
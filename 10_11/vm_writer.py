@@ -39,13 +39,26 @@ class ArithmeticCommand(Enum):
 
 class VMWriter:
     def __init__(self, fileName: str) -> None:
-        # VMコードを書き込む出力ファイルをオープン
+        # 出力ファイルは close() で初めて書き込む（途中で失敗したら何も書かない）
         self.fileName = fileName
-        self._file = open(fileName, "w", encoding="utf-8", newline="")
+        self._closed = False
+        # 出力済みのコードの前に命令を差し込めるよう、close() まで行を溜めておく
+        self._lines: list[str] = []
 
     def _writeLine(self, line: str) -> None:
-        # Jackコンパイラの仕様に合わせてLFで改行する
-        self._file.write(f"{line}\n")
+        self._lines.append(line)
+
+    def mark(self) -> int:
+        # 現在の出力位置。takeFrom() に渡すとそれ以降の行を取り出せる
+        return len(self._lines)
+
+    def takeFrom(self, mark: int) -> list[str]:
+        tail = self._lines[mark:]
+        del self._lines[mark:]
+        return tail
+
+    def putBack(self, lines: list[str]) -> None:
+        self._lines.extend(lines)
 
     def writePush(self, segment: Segment, index: int) -> None:
         self._writeLine(f"push {segment.value} {index}")
@@ -76,4 +89,10 @@ class VMWriter:
         self._writeLine("return")
 
     def close(self) -> None:
-        self._file.close()
+        if self._closed:
+            return
+        # Jackコンパイラの仕様に合わせてLFで改行する
+        with open(self.fileName, "w", encoding="utf-8", newline="") as f:
+            f.write("".join(f"{line}\n" for line in self._lines))
+        self._lines.clear()
+        self._closed = True
@@ -0,0 +1,174 @@
+import argparse
+import os
+
+# ベンチマーク用の大規模な合成プログラムを生成する
+
+
+def generate_asm(n_lines: int) -> str:
+    # ラベル・変数・A/C命令が混在するループを、指定行数に達するまで繰り返す
+    # NOTE: 32Kワードを超える位置のラベルはA命令で参照できないので、
+    #       ジャンプ先は先頭付近のブロックのラベルに限る
+    lines = ["// synthetic benchmark program", "@256", "D=A", "@SP", "M=D"]
+    block = 0
+    while len(lines) < n_lines:
+        lines += [
+            f"(LOOP_{block})",
+            f"@var_{block % 500}",
+            "D=M",
+            "@SP",
+            "AM=M+1",
+            "A=A-1",
+            "M=D",
+            f"@{block % 32768}",
+            "D=D+A",
+            f"@var_{(block + 1) % 500}",
+            "M=D",
+            "@SP",
+            "AM=M-1",
+            "D=M",
+            f"@LOOP_{block % 1000}",
+            "D;JGT",
+            f"@END_{block % 1000}",
+            "0;JMP",
+            f"(END_{block})",
+        ]
+        block += 1
+    lines += ["@END_0", "0;JMP"]
+    return "\n".join(lines) + "\n"
+
+
+def generate_vm(n_functions: int) -> dict[str, str]:
+    # Sys.init から順に呼び出される関数を持つ VM プログラム（ファイル名 -> 内容）
+    main = []
+    for i in range(n_functions):
+        callee = f"Main.f{(i + 1) % n_functions}"
+        main += [
+            f"function Main.f{i} 3",
+            "push argument 0",
+            "push constant 1",
+            "sub",
+            "pop local 0",
+            f"label LOOP_{i}",
+            "push local 0",
+            "push constant 0",
+            "gt",
+            "not",
+            f"if-goto END_{i}",
+            "push local 0",
+            "push static 0",
+            "add",
+            "pop static 0",
+            "push local 0",
+            "push constant 1",
+            "sub",
+            "pop local 0",
+            f"goto LOOP_{i}",
+            f"label END_{i}",
+            "push pointer 0",
+            "pop temp 0",
+            "push local 1",
+            "push local 2",
+            "lt",
+            f"if-goto SKIP_{i}",
+            "push constant 0",
+            f"call {callee} 1",
+            "pop temp 1",
+            f"label SKIP_{i}",
+            "push static 0",
+            "return",
+        ]
+    sys_vm = [
+        "function Sys.init 0",
+        "push constant 10",
+        "call Main.f0 1",
+        "pop temp 0",
+        "label HALT",
+        "goto HALT",
+    ]
+    return {"Main.vm": "\n".join(main) + "\n", "Sys.vm": "\n".join(sys_vm) + "\n"}
+
+
+def generate_jack(n_methods: int) -> str:
+    # 式・制御文・呼び出しを一通り含むメソッドを大量に持つクラス
+    lines = [
+        "class Big {",
+        "    field int x, y;",
+        "    field Array data;",
+        "    static int counter;",
+        "",
+        "    constructor Big new() {",
+        "        let x = 0;",
+        "        let y = 0;",
+        "        let data = Array.new(16);",
+        "        return this;",
+        "    }",
+    ]
+    for i in range(n_methods):
+        lines += [
+            "",
+            f"    method int m{i}(int a, int b) {{",
+            "        var int i, sum;",
+            "        var String s;",
+            "        let i = 0;",
+            "        let sum = 0;",
+            "        while (i < a) {",
+            "            let sum = sum + (i * 2) - (b / 3);",
+            "            let data[i & 15] = sum;",
+            "            if ((sum > 100) | (~(sum = b))) {",
+            "                let x = x + data[i & 15];",
+            "            } else {",
+            "                let y = -y;",
+            "            }",
+            "            let i = i + 1;",
+            "        }",
+            f'        let s = "method {i}";',
+            "        do Output.printString(s);",
+            f"        let counter = counter + m{(i + 1) % n_methods}(a - 1, b);",
+            "        return sum;",
+            "    }",
+        ]
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def write_synthetic(
+    directory: str, asm_lines: int, vm_functions: int, jack_methods: int
+) -> dict[str, str]:
+    # 生成したファイルを書き出し、種類ごとのパスを返す
+    os.makedirs(directory, exist_ok=True)
+
+    asm_path = os.path.join(directory, "Synthetic.asm")
+    with open(asm_path, "w") as f:
+        f.write(generate_asm(asm_lines))
+
+    vm_dir = os.path.join(directory, "SyntheticVm")
+    os.makedirs(vm_dir, exist_ok=True)
+    for name, source in generate_vm(vm_functions).items():
+        with open(os.path.join(vm_dir, name), "w") as f:
+            f.write(source)
+
+    jack_dir = os.path.join(directory, "SyntheticJack")
+    os.makedirs(jack_dir, exist_ok=True)
+    with open(os.path.join(jack_dir, "Big.jack"), "w") as f:
+        f.write(generate_jack(jack_methods))
+
+    return {"asm": asm_path, "vm": vm_dir, "jack": jack_dir}
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Generate synthetic programs")
+    arg_parser.add_argument("directory")
+    arg_parser.add_argument("--asm-lines", type=int, default=100_000)
+    arg_parser.add_argument("--vm-functions", type=int, default=3_000)
+    arg_parser.add_argument("--jack-methods", type=int, default=1_000)
+    args = arg_parser.parse_args()
+
+    paths = write_synthetic(
+        args.directory, args.asm_lines, args.vm_functions, args.jack_methods
+    )
+    for kind, path in paths.items():
+        print(f"{kind}: {path}")
+
+
+if __name__ == "__main__":
+    main()
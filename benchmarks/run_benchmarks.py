@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from generate import write_synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSEMBLER = os.path.join(ROOT, "06", "assembler.py")
+VM_TRANSLATOR = os.path.join(ROOT, "07_08", "vmtranslator.py")
+JACK_ANALYZER = os.path.join(ROOT, "10_11", "jack_analyzer.py")
+
+PONG_ASM = os.path.join(ROOT, "06", "sample", "Pong.asm")
+PONG_JACK = os.path.join(ROOT, "10_11", "sample", "Pong")
+
+
+def count_lines(path: str, suffix: str) -> int:
+    if os.path.isfile(path):
+        paths = [path]
+    else:
+        paths = [
+            os.path.join(path, name)
+            for name in os.listdir(path)
+            if name.endswith(suffix)
+        ]
+    total = 0
+    for p in paths:
+        with open(p, "rb") as f:
+            total += f.read().count(b"\n")
+    return total
+
+
+def run_once(command: list[str]) -> tuple[float, int]:
+    # 子プロセスの経過時間と最大RSS(KB)を測る
+    start = time.perf_counter()
+    with tempfile.TemporaryFile() as log:
+        proc = subprocess.Popen(
+            command, stdout=log, stderr=subprocess.STDOUT, cwd=ROOT
+        )
+        _, status, usage = os.wait4(proc.pid, 0)
+        elapsed = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        if proc.returncode != 0:
+            log.seek(0)
+            output = log.read().decode(errors="replace")
+            raise Exception(f"{' '.join(command)} failed:\n{output}")
+    return elapsed, usage.ru_maxrss
+
+
+def measure(
+    name: str, tool: str, target: str, suffix: str, repeat: int, work_dir: str
+) -> dict:
+    # 出力がサンプルを上書きしないよう、入力は作業ディレクトリにコピーして使う
+    copied = os.path.join(work_dir, name)
+    if os.path.isdir(target):
+        shutil.copytree(target, copied)
+    else:
+        os.makedirs(copied)
+        copied = shutil.copy(target, copied)
+
+    lines = count_lines(copied, suffix)
+    timings = []
+    peak_rss = 0
+    for _ in range(repeat):
+        elapsed, rss = run_once([sys.executable, tool, copied])
+        timings.append(elapsed)
+        peak_rss = max(peak_rss, rss)
+
+    best = min(timings)
+    return {
+        "name": name,
+        "tool": os.path.relpath(tool, ROOT),
+        "lines": lines,
+        "best_seconds": best,
+        "mean_seconds": sum(timings) / len(timings),
+        "lines_per_second": lines / best if best else 0.0,
+        "peak_rss_kb": peak_rss,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def compare(previous: dict, current: dict) -> None:
+    # 前回の結果と比べて、実行時間とメモリの変化を表示する
+    old = {b["name"]: b for b in previous["benchmarks"]}
+    for bench in current["benchmarks"]:
+        base = old.get(bench["name"])
+        if base is None:
+            continue
+        time_ratio = bench["best_seconds"] / base["best_seconds"]
+        rss_ratio = bench["peak_rss_kb"] / base["peak_rss_kb"]
+        print(f"{bench['name']:24} time x{time_ratio:.2f}  rss x{rss_ratio:.2f}")
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Toolchain benchmarks")
+    arg_parser.add_argument("-o", "--output", default="bench_results.json")
+    arg_parser.add_argument("-n", "--repeat", type=int, default=3)
+    arg_parser.add_argument("--asm-lines", type=int, default=100_000)
+    arg_parser.add_argument("--vm-functions", type=int, default=3_000)
+    arg_parser.add_argument("--jack-methods", type=int, default=1_000)
+    arg_parser.add_argument("--compare", metavar="JSON", help="比較対象の過去の結果")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        synthetic = write_synthetic(
+            os.path.join(tmp, "synthetic"),
+            args.asm_lines,
+            args.vm_functions,
+            args.jack_methods,
+        )
+
+        # Pong の VM コードはコンパイラの出力を使う
+        pong_vm = os.path.join(tmp, "PongVm")
+        shutil.copytree(PONG_JACK, pong_vm)
+        run_once([sys.executable, JACK_ANALYZER, pong_vm])
+
+        work_dir = os.path.join(tmp, "work")
+        cases = [
+            ("asm/Pong", ASSEMBLER, PONG_ASM, ".asm"),
+            ("asm/synthetic", ASSEMBLER, synthetic["asm"], ".asm"),
+            ("vm/Pong", VM_TRANSLATOR, pong_vm, ".vm"),
+            ("vm/synthetic", VM_TRANSLATOR, synthetic["vm"], ".vm"),
+            ("jack/Pong", JACK_ANALYZER, PONG_JACK, ".jack"),
+            ("jack/synthetic", JACK_ANALYZER, synthetic["jack"], ".jack"),
+        ]
+        benchmarks = []
+        for name, tool, target, suffix in cases:
+            result = measure(name, tool, target, suffix, args.repeat, work_dir)
+            benchmarks.append(result)
+            print(
+                f"{name:24} {result['lines']:>8} lines"
+                f" {result['best_seconds']:8.3f} s"
+                f" {result['lines_per_second']:>10.0f} lines/s"
+                f" {result['peak_rss_kb']:>8} KB"
+            )
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "benchmarks": benchmarks,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()